@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from agents.embed_cache import normalize_text
+
+# --------------------- Answer Cache ---------------------
+
+# Users keep asking the same questions ("summarize this page") about the same document.
+# Answers are cached under (document content hash, page window + retrieval mode, normalized query, history fingerprint):
+#   - an exact hit is answered before the query is even embedded
+#   - optionally, a query whose embedding is at least ANSWER_CACHE_SIMILARITY similar (cosine) to a cached
+#     query with the same document, page window and history reuses that answer (near-duplicate hit)
+# The content hash (not the doc_id) is used so re-uploads of the same PDF share answers.
+
+ANSWER_CACHE_ITEMS = int(os.getenv("ANSWER_CACHE_ITEMS", "10000"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))  # 0 disables near-duplicate hits
+
+
+def normalize_query(query: str) -> str:
+    return normalize_text(query).lower().rstrip("?!. ")
+
+
+def history_fingerprint(chat_history: list[dict]) -> str:
+    """Stable hash of a conversation, so the same question in a different conversation is a different entry."""
+    canonical = json.dumps([[msg.get("role"), normalize_text(str(msg.get("content", "")))] for msg in chat_history])
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    def __init__(self, max_items: int = ANSWER_CACHE_ITEMS, similarity_threshold: float = ANSWER_CACHE_SIMILARITY):
+        self.max_items = max_items
+        self.similarity_threshold = similarity_threshold
+        self._entries: OrderedDict[tuple, tuple[str, np.ndarray | None]] = OrderedDict()  # key -> (answer, query vector)
+        self._buckets: dict[tuple, list[tuple]] = {}  # (content hash, window, history) -> keys, for near-duplicate search
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content_hash: str, page_window: tuple[int, int], query: str, chat_history: list[dict], retrieval_mode: str = "") -> tuple:
+        return (content_hash, (*page_window, retrieval_mode), history_fingerprint(chat_history), normalize_query(query))
+
+    def get(self, key: tuple) -> str | None:
+        """Exact lookup. Misses are not counted here, call get_similar (or record_miss) afterwards."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry[0]
+
+    def get_similar(self, key: tuple, query_vector: list[float]) -> str | None:
+        """Near-duplicate lookup among cached queries sharing the key's document, page window and history."""
+        with self._lock:
+            if self.similarity_threshold > 0:
+                candidates = [k for k in self._buckets.get(key[:3], []) if self._entries[k][1] is not None]
+                if candidates:
+                    matrix = np.stack([self._entries[k][1] for k in candidates])
+                    query = np.asarray(query_vector, dtype=np.float32)
+                    similarities = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.similarity_threshold:
+                        self._entries.move_to_end(candidates[best])
+                        self.similar_hits += 1
+                        return self._entries[candidates[best]][0]
+            self.misses += 1
+            return None
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key: tuple, answer: str, query_vector: list[float] | None = None):
+        vector = np.asarray(query_vector, dtype=np.float32) if query_vector is not None else None
+        with self._lock:
+            if key not in self._entries:
+                self._buckets.setdefault(key[:3], []).append(key)
+            self._entries[key] = (answer, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                old_key, _ = self._entries.popitem(last=False)
+                bucket = self._buckets[old_key[:3]]
+                bucket.remove(old_key)
+                if not bucket:
+                    del self._buckets[old_key[:3]]
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.similar_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.similar_hits) / lookups if lookups else 0.0,
+            "items": len(self._entries),
+            "similarity_threshold": self.similarity_threshold,
+        }
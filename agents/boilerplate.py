@@ -0,0 +1,126 @@
+import os
+import re
+import threading
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+from agents.extraction import PageBlocks, blocks_text
+
+# --------------------- Boilerplate and Near-duplicate Removal ---------------------
+
+# Long documents repeat text on every page: running headers and footers, page numbers, copyright and
+# legal notices. Left in, it is chunked, embedded and indexed once per page, and crowds real content
+# out of the retrieved context. It is removed in two passes, both before anything is embedded:
+#   1. Blocks, right after extraction, over the whole document:
+#      - a header/footer block whose text (digits masked, so "Page 3 of 90" matches "Page 4 of 90")
+#        repeats on at least BOILERPLATE_MIN_FRACTION of the pages is dropped from every page
+#      - a body block of BOILERPLATE_MIN_CHARS or more repeated verbatim on BOILERPLATE_MIN_PAGES pages
+#        or more is kept on its first page only
+#   2. Chunks, as they are chunked: a chunk whose word 5-grams are at least DUPLICATE_CHUNK_SIMILARITY
+#      similar (Jaccard) to a chunk already kept from another page is dropped. Candidates are found with
+#      MinHash signatures and LSH bands, then verified exactly.
+
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))
+BOILERPLATE_MIN_FRACTION = float(os.getenv("BOILERPLATE_MIN_FRACTION", "0.3"))
+BOILERPLATE_MIN_CHARS = int(os.getenv("BOILERPLATE_MIN_CHARS", "80"))
+DUPLICATE_CHUNK_SIMILARITY = float(os.getenv("DUPLICATE_CHUNK_SIMILARITY", "0.9"))
+
+_DIGITS = re.compile(r"\d+")
+_WORD_PATTERN = re.compile(r"\w+")
+_SHINGLE_SIZE = 5
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _margin_signature(text: str) -> str:
+    return _DIGITS.sub("#", _normalize(text))
+
+
+def strip_boilerplate(pages_blocks: list[PageBlocks]) -> tuple[list[str], int]:
+    """Page texts with repeated headers, footers and boilerplate blocks removed, and the number of blocks removed."""
+    num_pages = len(pages_blocks)
+    margin_pages, body_pages = defaultdict(set), defaultdict(set)
+    for page, blocks in enumerate(pages_blocks):
+        for region, text in blocks:
+            if region != "body":
+                margin_pages[_margin_signature(text)].add(page)
+            elif len(text) >= BOILERPLATE_MIN_CHARS:
+                body_pages[_normalize(text)].add(page)
+
+    min_margin_pages = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_MIN_FRACTION * num_pages)
+    repeated_margins = {signature for signature, pages in margin_pages.items() if len(pages) >= min_margin_pages}
+    # Repeated body blocks stay on the first page they appear on
+    first_page = {text: min(pages) for text, pages in body_pages.items() if len(pages) >= BOILERPLATE_MIN_PAGES}
+
+    page_texts, removed = [], 0
+    for page, blocks in enumerate(pages_blocks):
+        kept = []
+        for region, text in blocks:
+            if region != "body":
+                drop = _margin_signature(text) in repeated_margins
+            else:
+                drop = first_page.get(_normalize(text), page) != page
+            if drop:
+                removed += 1
+            else:
+                kept.append((region, text))
+        page_texts.append(blocks_text(kept))
+    return page_texts, removed
+
+
+# MinHash with 64 hash functions in 16 LSH bands of 4 rows: chunks at Jaccard 0.9 share a band
+# with probability > 0.99, chunks at 0.5 are still candidates often enough to be verified exactly
+_NUM_HASHES = 64
+_BANDS = 16
+_ROWS = _NUM_HASHES // _BANDS
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(0)
+_HASH_A = _rng.integers(1, 1 << 31, size=_NUM_HASHES, dtype=np.uint64)
+_HASH_B = _rng.integers(0, 1 << 31, size=_NUM_HASHES, dtype=np.uint64)
+
+
+def shingle_hashes(text: str) -> set[int]:
+    """crc32 of every word 5-gram of a text (empty for texts shorter than 5 words)"""
+    words = _WORD_PATTERN.findall(text.lower())
+    return {zlib.crc32(" ".join(words[i:i + _SHINGLE_SIZE]).encode("utf-8")) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+
+
+def minhash(shingles: set[int]) -> np.ndarray:
+    hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    return ((np.outer(hashes, _HASH_A) + _HASH_B) % _MERSENNE_PRIME).min(axis=0)
+
+
+class NearDuplicateFilter:
+    """Chunks kept so far in one document, to drop near-duplicates of them found on other pages."""
+
+    def __init__(self, threshold: float = DUPLICATE_CHUNK_SIMILARITY):
+        self.threshold = threshold
+        self._buckets: dict[tuple[int, bytes], list[int]] = defaultdict(list)  # (band, band hash) -> kept chunk ids
+        self._kept: list[tuple[int, set[int]]] = []  # (page, shingles) of kept chunks
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+    def is_duplicate(self, text: str, page: int) -> bool:
+        """True if a near-duplicate of text was kept from another page. Otherwise text is kept (remembered) and False is returned."""
+        shingles = shingle_hashes(text)
+        if not shingles:
+            return False  # too short to compare
+        signature = minhash(shingles)
+        bands = [(band, signature[band * _ROWS:(band + 1) * _ROWS].tobytes()) for band in range(_BANDS)]
+
+        with self._lock:
+            candidates = {chunk_id for key in bands for chunk_id in self._buckets.get(key, ())}
+            for chunk_id in candidates:
+                other_page, other = self._kept[chunk_id]
+                if other_page != page and len(shingles & other) >= self.threshold * len(shingles | other):
+                    self.duplicates += 1
+                    return True
+            chunk_id = len(self._kept)
+            self._kept.append((page, shingles))
+            for key in bands:
+                self._buckets[key].append(chunk_id)
+            return False
@@ -1,22 +1,24 @@
-from openai import OpenAI
 from dotenv import load_dotenv
-import os
+import time
+from agents.clients import get_async_client, get_client, openai_slot
+from agents.metrics import api_call, record_stage, record_usage, timed
 
-# Load environment and set up client
+# Load environment (the clients are created on first use, see agents/clients.py)
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 LLM_MODEL = "gpt-3.5-turbo"  # or "gpt-4" if you're using GPT-4
 
-def get_llm_response(user_query: str, context: str, chat_history: list[dict]) -> str:
-    try:
-        # Format chat history into readable dialogue
-        formatted_history = "\n".join(
-            [f"{msg['role'].capitalize()}: {msg['content']}" for msg in chat_history]
-        )
+LLM_ERROR_MESSAGE = "There was an error processing your request."
+
+def build_messages(user_query: str, context: str, chat_history: list[dict]) -> list[dict]:
+    """System and user messages for a question, its retrieved context and the conversation so far."""
+    # Format chat history into readable dialogue
+    formatted_history = "\n".join(
+        [f"{msg['role'].capitalize()}: {msg['content']}" for msg in chat_history]
+    )
 
-        # System prompt focused on ReAct-based analytical behavior
-        system_prompt = """
+    # System prompt focused on ReAct-based analytical behavior
+    system_prompt = """
         You are a helpful, knowledgeable, and reflective assistant that responds naturally and conversationally to questions. 
         You must always answer using only the information provided in the context. If the context does not contain the necessary information, 
         respond honestly and politely say the answer is not available.
@@ -31,8 +33,8 @@ def get_llm_response(user_query: str, context: str, chat_history: list[dict]) ->
         Keep the tone intelligent, supportive, and focused on the given context.
         """
 
-        # User prompt containing query and context
-        user_prompt = f"""
+    # User prompt containing query and context
+    user_prompt = f"""
         Context:
         {context}
 
@@ -46,18 +48,102 @@ def get_llm_response(user_query: str, context: str, chat_history: list[dict]) ->
         If something is unclear or missing, ask the user a clarifying question instead of making assumptions.
         """
 
+    return [
+        {"role": "system", "content": system_prompt.strip()},
+        {"role": "user", "content": user_prompt.strip()}
+    ]
+
+def get_llm_response(user_query: str, context: str, chat_history: list[dict]) -> str:
+    try:
         # Call OpenAI API
-        response = client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt.strip()},
-                {"role": "user", "content": user_prompt.strip()}
-            ],
-            temperature=0.4
-        )
+        with timed("llm"), api_call("chat"):
+            response = get_client().chat.completions.create(
+                model=LLM_MODEL,
+                messages=build_messages(user_query, context, chat_history),
+                temperature=0.4
+            )
+        record_usage(response.usage)
 
         return response.choices[0].message.content
 
     except Exception as e:
         print(f"[ERROR] get_llm_response: {e}")
-        return "There was an error processing your request."
+        return LLM_ERROR_MESSAGE
+
+# Non-blocking variant used by the API, awaits the shared async client within the concurrency limit
+async def aget_llm_response(user_query: str, context: str, chat_history: list[dict]) -> str:
+    try:
+        with timed("llm"):
+            async with openai_slot():
+                with api_call("chat"):
+                    response = await get_async_client().chat.completions.create(
+                        model=LLM_MODEL,
+                        messages=build_messages(user_query, context, chat_history),
+                        temperature=0.4
+                    )
+        record_usage(response.usage)
+
+        return response.choices[0].message.content
+
+    except Exception as e:
+        print(f"[ERROR] aget_llm_response: {e}")
+        return LLM_ERROR_MESSAGE
+
+# Streaming variant, yields the answer text piece by piece as the model emits it
+async def astream_llm_response(user_query: str, context: str, chat_history: list[dict]):
+    start = time.perf_counter()
+    first_token = True
+    try:
+        with timed("llm"):
+            async with openai_slot():
+                with api_call("chat"):
+                    stream = await get_async_client().chat.completions.create(
+                        model=LLM_MODEL,
+                        messages=build_messages(user_query, context, chat_history),
+                        temperature=0.4,
+                        stream=True,
+                        stream_options={"include_usage": True}  # token counts arrive in a last chunk without choices
+                    )
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            if first_token:
+                                record_stage("llm_first_token", time.perf_counter() - start)
+                                first_token = False
+                            yield chunk.choices[0].delta.content
+                        record_usage(chunk.usage)
+
+    except Exception as e:
+        print(f"[ERROR] astream_llm_response: {e}")
+        yield LLM_ERROR_MESSAGE
+
+# Folds older conversation turns into a running summary (server-side sessions), None if the call fails
+async def asummarize_conversation(summary: str, turns: list[dict], max_words: int = 200) -> str | None:
+    formatted_turns = "\n".join(
+        [f"{msg['role'].capitalize()}: {msg['content']}" for msg in turns]
+    )
+    prompt = f"""
+        Summary of the conversation so far:
+        {summary or "(empty)"}
+
+        Newer turns of the conversation:
+        {formatted_turns}
+
+        Update the summary so it also covers the newer turns. Keep the questions the user asked, the key facts
+        of the answers and anything the user may refer back to. Write at most {max_words} words, no preamble.
+        """
+    try:
+        with timed("summarize"):
+            async with openai_slot():
+                with api_call("chat"):
+                    response = await get_async_client().chat.completions.create(
+                        model=LLM_MODEL,
+                        messages=[{"role": "user", "content": prompt.strip()}],
+                        temperature=0.2
+                    )
+        record_usage(response.usage)
+
+        return response.choices[0].message.content.strip()
+
+    except Exception as e:
+        print(f"[ERROR] asummarize_conversation: {e}")
+        return None
@@ -0,0 +1,59 @@
+import numpy as np
+
+from agents.vector_index import build_page_offsets
+
+# --------------------- Compact Chunk Store ---------------------
+
+# The chunks of a document are held as one contiguous UTF-8 buffer plus a few numpy arrays, instead
+# of one Python str (~50 bytes of overhead each, plus list slots) per chunk. Chunk ids are the ids
+# of the FAISS and BM25 indexes: chunks are stored page by page, so the chunks of page p are ids
+# page_offsets[p]..page_offsets[p + 1] - 1. Texts are decoded only when a chunk is read, which at
+# query time is the handful of chunks that make up the context.
+# This is also the on-disk layout (chunks.bin + offsets.npz, see agents/document_store.py). The BM25
+# and selection indexes are stored as arrays next to it, so a stored document is loaded without
+# decoding its chunks or building any per-chunk objects.
+
+
+class ChunkStore:
+    __slots__ = ("buffer", "byte_offsets", "chunk_pages", "page_offsets")
+
+    def __init__(self, buffer: bytes, byte_offsets: np.ndarray, page_offsets: np.ndarray):
+        self.buffer = buffer
+        self.byte_offsets = np.asarray(byte_offsets, dtype=np.int64)  # chunk i is buffer[byte_offsets[i]:byte_offsets[i + 1]]
+        self.page_offsets = np.asarray(page_offsets, dtype=np.int64)
+        # Page of every chunk (selection lookups map a matched chunk back to its page)
+        self.chunk_pages = np.repeat(np.arange(len(self.page_offsets) - 1, dtype=np.int32), np.diff(self.page_offsets))
+
+    @classmethod
+    def from_page_chunks(cls, page_chunks: list[list[str]]) -> "ChunkStore":
+        encoded = [chunk.encode("utf-8") for chunks in page_chunks for chunk in chunks]
+        byte_offsets = np.concatenate(([0], np.cumsum([len(chunk) for chunk in encoded], dtype=np.int64)))
+        return cls(b"".join(encoded), byte_offsets, build_page_offsets(page_chunks))
+
+    def __len__(self) -> int:
+        return len(self.byte_offsets) - 1
+
+    @property
+    def num_pages(self) -> int:
+        return len(self.page_offsets) - 1
+
+    def text(self, chunk_id: int) -> str:
+        return self.buffer[self.byte_offsets[chunk_id]:self.byte_offsets[chunk_id + 1]].decode("utf-8")
+
+    def chunk_id(self, page: int, index: int) -> int:
+        """Id of the index-th chunk of a page (0-based)"""
+        return int(self.page_offsets[page]) + index
+
+    def get(self, page: int, index: int) -> str:
+        return self.text(self.chunk_id(page, index))
+
+    def page_texts(self, page: int) -> list[str]:
+        return [self.text(chunk_id) for chunk_id in range(self.page_offsets[page], self.page_offsets[page + 1])]
+
+    def page_chunks(self) -> list[list[str]]:
+        """Chunk texts of every page, decoded (for building indexes; not kept around)"""
+        return [self.page_texts(page) for page in range(self.num_pages)]
+
+    def nbytes(self) -> int:
+        return len(self.buffer) + sum(array.nbytes for array in (self.byte_offsets, self.chunk_pages, self.page_offsets))
+
@@ -1,24 +1,106 @@
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
+import numpy as np
+import os
+import re
+from agents.embed import embedding_cache, embedding_provider
+from agents.lazy import lazy_resource
+from agents.tokens import get_encoding
 
 load_dotenv()  # Load environment variables from .env file
 
-# Initialize the embedding model (can be replaced with Hugging Face if needed)
+# Chunking strategy used at ingestion, overridable per upload:
+#   semantic - LangChain SemanticChunker, embeds every sentence group to find topic breakpoints (chunk vectors come for free)
+#   token    - packs whole sentences into windows of CHUNK_TOKENS tiktoken tokens with CHUNK_OVERLAP_TOKENS of overlap,
+#              pure CPU with no API calls (chunks are embedded afterwards in batched calls)
+CHUNKING_STRATEGIES = ("semantic", "token")
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "semantic")
+if CHUNKING_STRATEGY not in CHUNKING_STRATEGIES:
+    raise ValueError(f"CHUNKING_STRATEGY must be one of {CHUNKING_STRATEGIES}, got {CHUNKING_STRATEGY!r}")
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
 
-# The OpenAIEmbeddings class in LangChain looks for your OpenAI API key in the environment variable OPENAI_API_KEY by default.
-# You do not need to pass it directly in the code if it is set in your environment.
+# The embedding model comes from the configured embedding provider (EMBEDDING_PROVIDER, see agents/embedding_providers.py).
+# With the default OpenAI provider, OPENAI_API_KEY must be set in your environment.
 
-# How it works:
+# NOTE: the chunker shares the embedding model used for retrieval
+# so that the sentence embeddings it computes can be reused as chunk vectors.
 
-# When you call OpenAIEmbeddings(), it checks for OPENAI_API_KEY in your environment.
-# If the key is not set, you will get an authentication error.
 
-embedding_model = OpenAIEmbeddings()
-semantic_chunker = SemanticChunker(embedding_model)
+@lazy_resource("semantic_chunker")
+def get_semantic_chunker():
+    """Process-wide EmbeddingSemanticChunker over the shared embedding provider and cache (imports LangChain on first call)"""
+    from agents.semantic_chunker import CachedEmbeddings, EmbeddingSemanticChunker
+
+    return EmbeddingSemanticChunker(CachedEmbeddings(embedding_provider, cache=embedding_cache))
+
+
+# --------------------- Helpers ---------------------
+
+def pool_embeddings(embeddings: list[list[float]]) -> list[float]:
+    """Mean-pool a group of embeddings and L2-normalize the result (OpenAI embeddings are unit length)."""
+    pooled = np.mean(np.asarray(embeddings, dtype=np.float32), axis=0)
+    norm = np.linalg.norm(pooled)
+    if norm > 0:
+        pooled /= norm
+    return pooled.tolist()
 
 # --------------------- Generic Semantic Chunking Function ---------------------
 
 def chunk_text_semantically(text: str) -> list[str]:
     """Chunk any given text into semantically meaningful pieces."""
-    return semantic_chunker.split_text(text)
\ No newline at end of file
+    return get_semantic_chunker().split_text(text)
+
+def chunk_text_with_embeddings(text: str) -> tuple[list[str], list[list[float] | None]]:
+    """Chunk text semantically and return the chunks with the vectors derived while chunking."""
+    return get_semantic_chunker().split_text_with_embeddings(text)
+
+# --------------------- Token-window Chunking (no embeddings) ---------------------
+
+# Same sentence boundaries as SemanticChunker
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.?!])\s+")
+
+
+def split_sentences(text: str) -> list[str]:
+    return [sentence for sentence in _SENTENCE_BOUNDARY.split(text.strip()) if sentence]
+
+
+def chunk_text_by_tokens(text: str, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> list[str]:
+    """
+    Pack consecutive sentences into chunks of at most chunk_tokens tokens. Each chunk starts with the
+    trailing sentences of the previous one, up to overlap_tokens tokens. A sentence longer than
+    chunk_tokens on its own is cut into token windows.
+    """
+    encoding = get_encoding()
+    sentences = split_sentences(text)
+    sentence_tokens = encoding.encode_ordinary_batch(sentences) if sentences else []
+
+    # Oversized sentences become several pieces, each at most chunk_tokens long
+    pieces: list[tuple[str, int]] = []
+    for sentence, tokens in zip(sentences, sentence_tokens):
+        if len(tokens) <= chunk_tokens:
+            pieces.append((sentence, len(tokens)))
+            continue
+        for start in range(0, len(tokens), chunk_tokens):
+            window = tokens[start:start + chunk_tokens]
+            pieces.append((encoding.decode(window), len(window)))
+
+    chunks = []
+    current: list[tuple[str, int]] = []
+    current_tokens = 0
+    for piece, n_tokens in pieces:
+        if current and current_tokens + n_tokens > chunk_tokens:
+            chunks.append(" ".join(p for p, _ in current))
+            # Carry the tail of the finished chunk over as overlap
+            overlap, overlap_total = [], 0
+            for prev_piece, prev_tokens in reversed(current):
+                if overlap_total + prev_tokens > overlap_tokens or overlap_total + prev_tokens + n_tokens > chunk_tokens:
+                    break
+                overlap.insert(0, (prev_piece, prev_tokens))
+                overlap_total += prev_tokens
+            current, current_tokens = overlap, overlap_total
+        current.append((piece, n_tokens))
+        current_tokens += n_tokens
+
+    if current:
+        chunks.append(" ".join(p for p, _ in current))
+    return chunks
@@ -0,0 +1,53 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+from agents.lazy import lazy_resource
+
+load_dotenv()
+
+# --------------------- Shared Async OpenAI Client ---------------------
+
+# The query path awaits OpenAI instead of blocking the event loop. All async calls share one
+# client with a pooled HTTP connection, and a semaphore bounds how many requests are in flight
+# at once so bursts of users queue here instead of piling onto the API.
+# The SDK is imported when a client is first needed (see agents/lazy.py).
+
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+
+_semaphore: asyncio.Semaphore | None = None
+
+
+@lazy_resource("openai_async_client")
+def get_async_client():
+    """Process-wide AsyncOpenAI client (OPENAI_API_KEY / OPENAI_BASE_URL are read from the environment)."""
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+            ),
+        ),
+    )
+
+
+@lazy_resource("openai_client")
+def get_client():
+    """Process-wide synchronous OpenAI client, for code running in worker threads"""
+    from openai import OpenAI
+
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+def openai_slot() -> asyncio.Semaphore:
+    """Concurrency limiter for async OpenAI calls, use as `async with openai_slot(): ...`"""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+    return _semaphore
@@ -0,0 +1,98 @@
+import os
+import re
+
+from agents.tokens import count_tokens, truncate_tokens
+
+# --------------------- Token-budgeted Prompt Assembly ---------------------
+
+# The prompt used to grow with every turn of a conversation (the client sends the whole history)
+# and with chunk size (up to 3 x top_k chunks were concatenated). Context and history now share
+# PROMPT_TOKEN_BUDGET tokens (the fixed instructions of the system prompt are not counted):
+#   - history keeps the most recent turns within HISTORY_TOKEN_BUDGET, older turns are dropped
+#     (a single turn larger than the budget keeps its last tokens); a session summary is never dropped
+#   - context gets whatever is left after the query and the history, filled with the best ranked
+#     chunks that fit, skipping chunks that repeat text already selected (e.g. headers repeated on
+#     neighboring pages, or the overlap of consecutive token-window chunks)
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1000"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+# Word n-grams compared to detect overlapping chunks
+_SHINGLE_SIZE = 5
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _history_line(message: dict) -> str:
+    # Same format as chatbot.build_messages
+    return f"{message['role'].capitalize()}: {message['content']}"
+
+
+def trim_history(chat_history: list[dict], max_tokens: int = HISTORY_TOKEN_BUDGET) -> tuple[list[dict], int]:
+    """
+    Most recent turns of chat_history fitting in max_tokens. Returns (kept turns, oldest first, and their token count).
+    A leading session summary (role "summary") is always kept, it stands for every turn that is not in the
+    history anymore: only the turns after it are dropped to make room (the summary itself is cut to the budget).
+    """
+    kept, used = [], 0
+    if chat_history and chat_history[0]["role"] == "summary":
+        summary, chat_history = chat_history[0], chat_history[1:]
+        prefix_tokens = count_tokens(_history_line({**summary, "content": ""})) + 1
+        content = truncate_tokens(str(summary["content"]), max_tokens - prefix_tokens)
+        if content:
+            kept.append({**summary, "content": content})
+            used = count_tokens(_history_line(kept[0])) + 1
+
+    turns, turn_tokens = [], 0
+    for message in reversed(chat_history):
+        tokens = count_tokens(_history_line(message)) + 1  # + newline
+        if used + turn_tokens + tokens > max_tokens:
+            if not turns:
+                # The latest turn alone is over budget: keep its end, which is what the next question follows up on
+                prefix_tokens = count_tokens(_history_line({**message, "content": ""})) + 1
+                content = truncate_tokens(str(message["content"]), max_tokens - used - prefix_tokens, keep_end=True)
+                if content:
+                    turns.append({**message, "content": content})
+                    turn_tokens = count_tokens(_history_line(turns[-1])) + 1
+            break
+        turns.append(message)
+        turn_tokens += tokens
+    return kept + list(reversed(turns)), used + turn_tokens
+
+
+def _shingles(text: str) -> set[tuple[str, ...]]:
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < _SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+
+
+def is_redundant(shingles: set, selected: list[set], threshold: float = CONTEXT_DEDUP_THRESHOLD) -> bool:
+    """True if at least `threshold` of a chunk's word 5-grams already appear in one selected chunk"""
+    if not shingles:
+        return True
+    return any(len(shingles & other) >= threshold * len(shingles) for other in selected)
+
+
+def assemble_context(ranked_chunks: list[str], max_tokens: int) -> str:
+    """
+    Best-first chunks joined by blank lines, within max_tokens. A chunk that does not fit is skipped,
+    so a shorter, lower ranked one can still use the remaining budget.
+    """
+    selected, selected_shingles, used = [], [], 0
+    for chunk in ranked_chunks:
+        shingles = _shingles(chunk)
+        if is_redundant(shingles, selected_shingles):
+            continue
+        tokens = count_tokens(chunk) + 2  # + blank line separator
+        if used + tokens > max_tokens:
+            continue
+        selected.append(chunk)
+        selected_shingles.append(shingles)
+        used += tokens
+    return "\n\n".join(selected)
+
+
+def context_budget(query: str, history_tokens: int, budget: int = PROMPT_TOKEN_BUDGET) -> int:
+    """Tokens left for retrieved context once the query and the kept history are in the prompt"""
+    return max(0, budget - count_tokens(query) - history_tokens)
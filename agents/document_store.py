@@ -0,0 +1,214 @@
+import json
+import os
+import re
+import shutil
+import time
+from typing import TYPE_CHECKING
+from uuid import uuid4
+
+import numpy as np
+
+from agents.chunk_store import ChunkStore
+
+if TYPE_CHECKING:
+    import faiss  # imported on first use
+
+# --------------------- Persistent Document Store ---------------------
+
+# Every ingested document is written to DOCUMENT_STORE_DIR/<doc_id>/ as
+#   index.faiss   - the document's FAISS index (read back memory-mapped)
+#   chunks.bin    - all chunk texts as one UTF-8 buffer (the buffer of the document's ChunkStore)
+#   offsets.npz   - byte offsets of each chunk in chunks.bin and the page offset table
+#   lexical.npz, selection.npz - arrays of the document's BM25 and selection indexes, so loading a
+#                   document neither decodes its chunks nor rebuilds them (older documents without
+#                   them get their indexes rebuilt from the chunks)
+#   meta.json     - small descriptive fields (number of pages, format version)
+#   source.pdf    - the uploaded PDF, stored before ingestion and served back to viewers
+# Nothing is scanned at startup: a document is only read when it is first queried.
+# The store is pruned on upload: documents not loaded for DOCUMENT_STORE_TTL_DAYS are deleted, then the
+# least recently used ones until the store fits in DOCUMENT_STORE_MAX_MB. The modification time of a
+# document's directory is its last use (set when it is written, refreshed when it is loaded).
+
+DOCUMENT_STORE_DIR = os.getenv("DOCUMENT_STORE_DIR", ".cache/documents")
+DOCUMENT_STORE_MAX_MB = float(os.getenv("DOCUMENT_STORE_MAX_MB", "1024"))
+DOCUMENT_STORE_TTL_DAYS = float(os.getenv("DOCUMENT_STORE_TTL_DAYS", "30"))
+STORE_FORMAT_VERSION = 1
+SOURCE_FILENAME = "source.pdf"
+
+_DOC_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _mmap_flags() -> int:
+    import faiss
+
+    # Flat indexes can only be memory-mapped with IO_FLAG_MMAP_IFC (faiss >= 1.9), older versions fall back to IO_FLAG_MMAP
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def _document_dir(doc_id: str, store_dir: str) -> str:
+    # doc_ids come from clients, never let them escape the store directory
+    if not _DOC_ID_PATTERN.match(doc_id):
+        raise ValueError(f"Invalid doc_id: {doc_id!r}")
+    return os.path.join(store_dir, doc_id)
+
+
+def has_document(doc_id: str, store_dir: str = DOCUMENT_STORE_DIR) -> bool:
+    try:
+        return os.path.exists(os.path.join(_document_dir(doc_id, store_dir), "meta.json"))
+    except ValueError:
+        return False
+
+
+def save_document(
+    doc_id: str,
+    chunks: ChunkStore,
+    index: "faiss.Index | None",
+    store_dir: str = DOCUMENT_STORE_DIR,
+    meta: dict | None = None,
+    indexes: dict[str, dict[str, np.ndarray]] | None = None,
+):
+    """
+    Persist a document's chunks and index. Written to a temporary directory first, then renamed into place.
+    meta holds extra JSON-serializable fields stored in meta.json (e.g. the content hash).
+    indexes maps a name to the arrays of another index of the document, stored as <name>.npz.
+    """
+    target = _document_dir(doc_id, store_dir)
+    tmp = os.path.join(store_dir, f".tmp-{doc_id}-{uuid4().hex}")
+    os.makedirs(tmp)
+
+    try:
+        with open(os.path.join(tmp, "chunks.bin"), "wb") as f:
+            f.write(chunks.buffer)
+        np.savez(os.path.join(tmp, "offsets.npz"), chunk_offsets=chunks.byte_offsets, page_offsets=chunks.page_offsets)
+
+        if index is not None:
+            import faiss
+
+            faiss.write_index(index, os.path.join(tmp, "index.faiss"))
+        for name, arrays in (indexes or {}).items():
+            np.savez(os.path.join(tmp, f"{name}.npz"), **arrays)
+
+        # meta.json is written last, its presence marks a complete document
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({**(meta or {}), "version": STORE_FORMAT_VERSION, "num_pages": chunks.num_pages}, f)
+
+        old = None
+        if os.path.exists(target):
+            # The uploaded PDF is stored before ingestion, carry it over (a hard link, so it stays servable meanwhile)
+            source = os.path.join(target, SOURCE_FILENAME)
+            if os.path.exists(source):
+                try:
+                    os.link(source, os.path.join(tmp, SOURCE_FILENAME))
+                except OSError:
+                    shutil.copy2(source, os.path.join(tmp, SOURCE_FILENAME))
+            # Moved aside and deleted only once the new directory is in place, so readers never miss the document
+            old = os.path.join(store_dir, f".old-{doc_id}-{uuid4().hex}")
+            os.replace(target, old)
+        os.replace(tmp, target)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def load_document(
+    doc_id: str, store_dir: str = DOCUMENT_STORE_DIR
+) -> "tuple[ChunkStore, faiss.Index | None, dict, dict[str, dict[str, np.ndarray]]] | None":
+    """Load (chunks, index, meta, indexes) of a persisted document, or None if it is not stored."""
+    if not has_document(doc_id, store_dir):
+        return None
+    path = _document_dir(doc_id, store_dir)
+
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+
+    with open(os.path.join(path, "chunks.bin"), "rb") as f:
+        buffer = f.read()
+    with np.load(os.path.join(path, "offsets.npz")) as offsets:
+        chunk_offsets, page_offsets = offsets["chunk_offsets"], offsets["page_offsets"]
+
+    index_path = os.path.join(path, "index.faiss")
+    import faiss
+
+    index = faiss.read_index(index_path, _mmap_flags()) if os.path.exists(index_path) else None
+    indexes = {}
+    for filename in os.listdir(path):
+        if filename.endswith(".npz") and filename != "offsets.npz":
+            with np.load(os.path.join(path, filename)) as arrays:
+                indexes[filename[:-len(".npz")]] = dict(arrays)
+    os.utime(path)  # marks the document as recently used for prune_documents
+
+    return ChunkStore(buffer, chunk_offsets, page_offsets), index, meta, indexes
+
+
+def save_source_file(doc_id: str, contents: bytes, store_dir: str = DOCUMENT_STORE_DIR) -> str:
+    """Store the uploaded PDF of a document (written to a temporary file, then renamed into place). Returns its path."""
+    target = _document_dir(doc_id, store_dir)
+    os.makedirs(target, exist_ok=True)
+    path = os.path.join(target, SOURCE_FILENAME)
+    tmp = f"{path}.tmp-{uuid4().hex}"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(contents)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+
+def source_file_path(doc_id: str, store_dir: str = DOCUMENT_STORE_DIR) -> str | None:
+    """Path of a document's uploaded PDF, or None if it is not stored."""
+    try:
+        path = os.path.join(_document_dir(doc_id, store_dir), SOURCE_FILENAME)
+    except ValueError:
+        return None
+    return path if os.path.exists(path) else None
+
+
+def delete_document(doc_id: str, store_dir: str = DOCUMENT_STORE_DIR):
+    shutil.rmtree(_document_dir(doc_id, store_dir), ignore_errors=True)
+
+
+def _directory_nbytes(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def prune_documents(
+    store_dir: str = DOCUMENT_STORE_DIR,
+    max_bytes: int = int(DOCUMENT_STORE_MAX_MB * 1024 * 1024),
+    ttl_seconds: float = DOCUMENT_STORE_TTL_DAYS * 86400,
+    in_use=lambda doc_id: False,
+) -> list[str]:
+    """
+    Delete stored documents unused for ttl_seconds, then least recently used ones until the store fits in max_bytes.
+    Documents for which in_use(doc_id) is true are kept. Returns the deleted doc_ids.
+    """
+    if not os.path.isdir(store_dir):
+        return []
+    # Directories left by a save interrupted mid-way (a process killed between writing and renaming)
+    for entry in os.scandir(store_dir):
+        if entry.name.startswith((".tmp-", ".old-")) and entry.stat().st_mtime < time.time() - 3600:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    documents = sorted(  # (last used, doc_id, bytes), least recently used first
+        (entry.stat().st_mtime, entry.name, _directory_nbytes(entry.path))
+        for entry in os.scandir(store_dir)
+        if entry.is_dir() and _DOC_ID_PATTERN.match(entry.name)
+    )
+    total_bytes = sum(nbytes for _, _, nbytes in documents)
+    cutoff = time.time() - ttl_seconds
+
+    deleted = []
+    for last_used, doc_id, nbytes in documents:
+        if last_used >= cutoff and total_bytes <= max_bytes:
+            break
+        if in_use(doc_id):
+            continue
+        delete_document(doc_id, store_dir)
+        total_bytes -= nbytes
+        deleted.append(doc_id)
+    if deleted:
+        print(f"[INFO] Pruned {len(deleted)} documents from the document store ({total_bytes} bytes left)")
+    return deleted
@@ -1,28 +1,33 @@
 from dotenv import load_dotenv
 import os
-import openai
-from langchain_openai import OpenAIEmbeddings
+from agents.embed_cache import EmbeddingCache, cached_embed, acached_embed
+from agents.embedding_providers import create_embedding_provider
 
-LLM_MODEL = "gpt-3.5-turbo" 
+LLM_MODEL = "gpt-3.5-turbo"
 
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
-embedding_model = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=openai.api_key
-)
+QUERY_EMBEDDING_CACHE_MB = float(os.getenv("QUERY_EMBEDDING_CACHE_MB", "16"))
 
-EMBEDDING_MODEL = "text-embedding-3-small"
+# Chosen with EMBEDDING_PROVIDER (see agents/embedding_providers.py), shared by chunking, ingestion and queries
+embedding_provider = create_embedding_provider()
 
-# Length of each embedding is 1536 for text-embedding-3-small
+# Shared by get_embeddings and the semantic chunker, so a re-uploaded document is served from cache
+embedding_cache = EmbeddingCache()
+
+# Queries are short-lived and repeat within a session, they get their own in-memory LRU (no disk tier)
+query_embedding_cache = EmbeddingCache(cache_dir=None, max_memory_bytes=int(QUERY_EMBEDDING_CACHE_MB * 1024 * 1024))
+
+# Length of each embedding is embedding_provider.dimension (1536 for text-embedding-3-small)
 def get_embeddings(arr:list) -> list[list[float]]:
-    
-    response = openai.embeddings.create(
-        input=arr,
-        model=EMBEDDING_MODEL    
-    )
-    
-    embeddings = [record.embedding for record in response.data]
-    
-    return embeddings
\ No newline at end of file
+
+    embeddings = cached_embed(embedding_cache, embedding_provider.name, arr, embedding_provider.embed)
+
+    return embeddings
+
+# Query embeddings for request handlers, served from the in-memory query LRU when repeated
+async def aget_query_embedding(query: str) -> list[float]:
+
+    embeddings = await acached_embed(query_embedding_cache, embedding_provider.name, [query], embedding_provider.aembed)
+
+    return embeddings[0]
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# --------------------- Content-addressed Embedding Cache ---------------------
+
+# Two tiers, both keyed by (model name, sha256 of the whitespace-normalized text):
+#   1. an in-process LRU of float32 vectors, bounded by EMBEDDING_CACHE_MEMORY_MB (a 1536-dim vector is 6 KB)
+#   2. a persistent SQLite table storing vectors as float32 blobs
+# A disk hit is promoted into the LRU. Hit/miss counters are kept per tier.
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+EMBEDDING_CACHE_MEMORY_MB = float(os.getenv("EMBEDDING_CACHE_MEMORY_MB", "64"))
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different copies of a text share one cache entry."""
+    return " ".join(text.split())
+
+
+def text_key(model: str, text: str) -> str:
+    """Cache key for a text embedded with a given model."""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir: str | None = EMBEDDING_CACHE_DIR, max_memory_bytes: int = int(EMBEDDING_CACHE_MEMORY_MB * 1024 * 1024)):
+        self.max_memory_bytes = max_memory_bytes
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # cache_dir=None keeps the cache in memory only
+        self._db = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(cache_dir, "embeddings.sqlite3"), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db.commit()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous.nbytes
+        self._memory[key] = vector
+        self._memory_bytes += vector.nbytes
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """Look up embeddings for texts, returning None for every text that is not cached."""
+        keys = [text_key(model, text) for text in texts]
+        found: dict[str, np.ndarray] = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self.memory_hits += 1
+
+            disk_keys = list({key for key in keys if key not in found})
+            if disk_keys and self._db is not None:
+                # Stay below SQLite's bound-parameter limit
+                for start in range(0, len(disk_keys), 500):
+                    batch = disk_keys[start:start + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, found[key])
+
+            disk_keys = set(disk_keys)
+            for key in keys:
+                if key in disk_keys:
+                    if key in found:
+                        self.disk_hits += 1
+                    else:
+                        self.misses += 1
+
+        return [found[key].tolist() if key in found else None for key in keys]
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]):
+        """Store embeddings for texts in both tiers."""
+        items = [(text_key(model, text), np.asarray(vector, dtype=np.float32)) for text, vector in zip(texts, vectors)]
+
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in items],
+                )
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for both tiers."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+        }
+
+
+def _missing_texts(texts: list[str], vectors: list[list[float] | None]) -> list[str]:
+    """Distinct texts (by normalized form) that were not found in the cache."""
+    missing: dict[str, str] = {}  # normalized text -> original text
+    for text, vector in zip(texts, vectors):
+        if vector is None:
+            missing.setdefault(normalize_text(text), text)
+    return list(missing.values())
+
+
+def _fill_missing(texts: list[str], vectors: list[list[float] | None], embedded: list[str], fresh: list[list[float]]) -> list[list[float]]:
+    by_text = {normalize_text(text): vector for text, vector in zip(embedded, fresh)}
+    return [vector if vector is not None else by_text[normalize_text(text)] for text, vector in zip(texts, vectors)]
+
+
+def cached_embed(cache: EmbeddingCache, model: str, texts: list[str], embed_fn) -> list[list[float]]:
+    """
+    Embed texts through the cache: only texts that miss both tiers are sent to embed_fn,
+    and each distinct missing text is embedded once.
+    """
+    vectors = cache.get_many(model, texts)
+    to_embed = _missing_texts(texts, vectors)
+    if not to_embed:
+        return vectors
+
+    fresh = embed_fn(to_embed)
+    cache.put_many(model, to_embed, fresh)
+    return _fill_missing(texts, vectors, to_embed, fresh)
+
+
+async def acached_embed(cache: EmbeddingCache, model: str, texts: list[str], aembed_fn) -> list[list[float]]:
+    """Same as cached_embed, for an async embedding function."""
+    vectors = cache.get_many(model, texts)
+    to_embed = _missing_texts(texts, vectors)
+    if not to_embed:
+        return vectors
+
+    fresh = await aembed_fn(to_embed)
+    cache.put_many(model, to_embed, fresh)
+    return _fill_missing(texts, vectors, to_embed, fresh)
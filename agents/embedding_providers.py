@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import os
+import re
+import zlib
+
+import numpy as np
+
+from agents.clients import get_async_client, get_client, openai_slot
+from agents.embedding_scheduler import EMBEDDING_BATCH_TOKENS, EMBEDDING_MAX_INPUT_TOKENS, EmbeddingScheduler, pack_batches
+from agents.metrics import EMBEDDING_BATCH_TEXTS, api_call, record_usage, timed
+from agents.tokens import get_encoding
+
+# --------------------- Embedding Providers ---------------------
+
+# Chunking, ingestion and query embedding all go through one EmbeddingProvider, selected with
+# EMBEDDING_PROVIDER:
+#   openai  - OpenAI embeddings API (EMBEDDING_MODEL, default text-embedding-3-small), the default
+#   hashing - CPU-local signed feature hashing of words and word bigrams, no network and no model files
+#   fake    - deterministic pseudo-random unit vectors per text, for tests and offline benchmarks
+# A provider declares its dimension and a name that identifies its vectors; the embedding cache is
+# keyed by that name, so switching providers never serves vectors of the wrong kind.
+# The OpenAI provider sends its batches through a rate-limited scheduler (see agents/embedding_scheduler.py).
+
+EMBEDDING_PROVIDERS = ("openai", "hashing", "fake")
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "768"))  # hashing and fake providers only
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "512"))
+
+OPENAI_EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class EmbeddingProvider:
+    """
+    Base class: subclasses set name and dimension and implement _embed_batch.
+    embed / aembed split their input into batches of at most batch_size texts.
+    """
+
+    name: str
+    dimension: int
+
+    def __init__(self, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def _batches(self, texts: list[str]) -> list[list[str]]:
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        raise NotImplementedError
+
+    async def _aembed_batch(self, texts: list[str]) -> list[list[float]]:
+        # Local providers are CPU-bound, keep them off the event loop
+        return await asyncio.to_thread(self._embed_batch, texts)
+
+    def _timed_batch(self, texts: list[str]) -> list[list[float]]:
+        EMBEDDING_BATCH_TEXTS.labels(self.name).observe(len(texts))
+        with timed("embed"):
+            return self._embed_batch(texts)
+
+    async def _atimed_batch(self, texts: list[str]) -> list[list[float]]:
+        EMBEDDING_BATCH_TEXTS.labels(self.name).observe(len(texts))
+        with timed("embed"):
+            return await self._aembed_batch(texts)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return [vector for batch in self._batches(texts) for vector in self._timed_batch(batch)]
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        results = await asyncio.gather(*(self._atimed_batch(batch) for batch in self._batches(texts)))
+        return [vector for batch in results for vector in batch]
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """
+    Batches are bounded by batch_size texts and max_batch_tokens tokens, and sent concurrently through an
+    EmbeddingScheduler that paces and retries them (the SDK's own retries are disabled, so they do not
+    bypass the rate limit). Inputs over the model's limit of 8191 tokens are truncated.
+    """
+
+    def __init__(
+        self,
+        model: str = EMBEDDING_MODEL,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_batch_tokens: int = EMBEDDING_BATCH_TOKENS,
+        scheduler: EmbeddingScheduler | None = None,
+    ):
+        super().__init__(batch_size)
+        self.name = model
+        self.dimension = OPENAI_EMBEDDING_DIMENSIONS.get(model, 1536)
+        self.max_batch_tokens = max_batch_tokens
+        self.scheduler = scheduler or EmbeddingScheduler("embeddings")
+        self._client = None
+        self._async_client = None
+
+    def _token_batches(self, texts: list[str]) -> list[tuple[list[str], int]]:
+        """(texts, token count) batches, in input order"""
+        encoding = get_encoding()
+        tokens = encoding.encode_ordinary_batch(texts)
+        texts = [
+            encoding.decode(ids[:EMBEDDING_MAX_INPUT_TOKENS]) if len(ids) > EMBEDDING_MAX_INPUT_TOKENS else text
+            for text, ids in zip(texts, tokens)
+        ]
+        counts = [min(len(ids), EMBEDDING_MAX_INPUT_TOKENS) for ids in tokens]
+        return [
+            (texts[start:stop], sum(counts[start:stop]))
+            for start, stop in pack_batches(counts, self.batch_size, self.max_batch_tokens)
+        ]
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        if self._client is None:
+            self._client = get_client().with_options(max_retries=0)
+        with api_call("embeddings"):
+            response = self._client.embeddings.create(input=texts, model=self.name)
+        record_usage(response.usage)
+        return [record.embedding for record in response.data]
+
+    async def _aembed_batch(self, texts: list[str]) -> list[list[float]]:
+        if self._async_client is None:
+            self._async_client = get_async_client().with_options(max_retries=0)
+        async with openai_slot():
+            with api_call("embeddings"):
+                response = await self._async_client.embeddings.create(input=texts, model=self.name)
+        record_usage(response.usage)
+        return [record.embedding for record in response.data]
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        results = self.scheduler.run(self._timed_batch, self._token_batches(texts))
+        return [vector for batch in results for vector in batch]
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        results = await self.scheduler.arun(self._atimed_batch, self._token_batches(texts))
+        return [vector for batch in results for vector in batch]
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Bag of words and word bigrams hashed into `dimension` signed buckets (crc32, stable across processes),
+    with sublinear term frequency and L2 normalization. Captures lexical overlap only, but needs no
+    network, no model download, and embeds thousands of chunks per second on one core.
+    """
+
+    def __init__(self, dimension: int = EMBEDDING_DIMENSION, batch_size: int = EMBEDDING_BATCH_SIZE):
+        super().__init__(batch_size)
+        self.name = f"hashing-{dimension}"
+        self.dimension = dimension
+
+    def _features(self, text: str) -> list[str]:
+        words = _TOKEN_PATTERN.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.array([zlib.crc32(feature.encode("utf-8")) for feature in self._features(text)], dtype=np.uint32)
+            if not len(hashes):
+                continue
+            # Low bits choose the bucket, the top bit the sign, so colliding features tend to cancel out
+            signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix[row], hashes % self.dimension, signs)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1.0)
+        return matrix.tolist()
+
+
+class FakeEmbeddingProvider(EmbeddingProvider):
+    """Deterministic unit vectors seeded by a hash of the text: identical texts embed identically, nothing else is meaningful."""
+
+    def __init__(self, dimension: int = EMBEDDING_DIMENSION, batch_size: int = EMBEDDING_BATCH_SIZE):
+        super().__init__(batch_size)
+        self.name = f"fake-{dimension}"
+        self.dimension = dimension
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+            vectors.append((vector / np.linalg.norm(vector)).tolist())
+        return vectors
+
+
+def create_embedding_provider(provider: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    if provider == "openai":
+        return OpenAIEmbeddingProvider()
+    if provider == "hashing":
+        return HashingEmbeddingProvider()
+    if provider == "fake":
+        return FakeEmbeddingProvider()
+    raise ValueError(f"Unknown embedding provider {provider!r}, expected one of {EMBEDDING_PROVIDERS}")
@@ -0,0 +1,187 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.metrics import API_RETRIES
+
+# --------------------- Rate-limited Embedding Scheduler ---------------------
+
+# Remote embedding calls go through one scheduler per provider, which
+#   - packs texts into batches bounded by EMBEDDING_BATCH_SIZE texts and EMBEDDING_BATCH_TOKENS tokens
+#     (the API rejects requests over 2048 inputs or 300k tokens, and inputs over 8191 tokens),
+#   - sends the batches of one call concurrently, EMBEDDING_CONCURRENCY at a time,
+#   - paces every request against EMBEDDING_REQUESTS_PER_MINUTE and EMBEDDING_TOKENS_PER_MINUTE, shared by
+#     all threads and event loops of the process, so bursts queue here instead of coming back as 429s,
+#   - retries rate limited (429), server (5xx) and connection errors with exponential backoff, honoring
+#     Retry-After. A 429 also pauses all other sends for the same delay.
+# Results are reassembled in input order.
+
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "50000"))
+EMBEDDING_MAX_INPUT_TOKENS = 8191
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_REQUESTS_PER_MINUTE = float(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "3000"))  # 0 disables the limit
+EMBEDDING_TOKENS_PER_MINUTE = float(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "1000000"))  # 0 disables the limit
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+# Budget that may be spent at once after an idle period, in seconds of the per-minute rate
+RATE_LIMIT_BURST_SECONDS = 10.0
+
+
+def pack_batches(token_counts: list[int], max_texts: int, max_tokens: int) -> list[tuple[int, int]]:
+    """Split texts, in order, into (start, stop) ranges of at most max_texts texts and max_tokens tokens (at least one text each)."""
+    batches, start, tokens = [], 0, 0
+    for i, count in enumerate(token_counts):
+        if i > start and (i - start >= max_texts or tokens + count > max_tokens):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += count
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+class _Bucket:
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = self.rate * RATE_LIMIT_BURST_SECONDS
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self, amount: float, now: float) -> float:
+        """Take amount from the bucket (the level may go negative) and return the seconds until it is paid for."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+
+class RateLimiter:
+    """
+    Requests and tokens per minute, as token buckets. reserve() books a request and returns how long to
+    wait before sending it, so concurrent callers are spread out in booking order. Thread-safe, never blocks.
+    """
+
+    def __init__(self, requests_per_minute: float = EMBEDDING_REQUESTS_PER_MINUTE, tokens_per_minute: float = EMBEDDING_TOKENS_PER_MINUTE):
+        self._requests = _Bucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._paused_until - now
+            if self._requests is not None:
+                wait = max(wait, self._requests.take(1, now))
+            if self._tokens is not None:
+                wait = max(wait, self._tokens.take(tokens, now))
+            return max(0.0, wait)
+
+    def pause(self, seconds: float):
+        """Hold back every send for `seconds` (after the API reported a rate limit)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def is_retryable(error: Exception) -> bool:
+    import openai  # already loaded by the call that failed
+
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code in (408, 409) or error.status_code >= 500)
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds before retry number attempt + 1: the server's Retry-After if given, else exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), RETRY_MAX_SECONDS)
+        except ValueError:
+            pass  # HTTP-date form, fall back to backoff
+    backoff = min(RETRY_BASE_SECONDS * 2 ** attempt, RETRY_MAX_SECONDS)
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+# Held during every synchronous request, so EMBEDDING_CONCURRENCY bounds the requests in flight across ingestion
+# jobs and chunking threads, whether a call's batches run on the pool below or (single batches) on the caller's thread
+_send_slots = threading.BoundedSemaphore(EMBEDDING_CONCURRENCY)
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Runs the batches of multi-batch calls concurrently
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY, thread_name_prefix="embedding")
+        return _executor
+
+
+class EmbeddingScheduler:
+    def __init__(self, api: str, rate_limiter: RateLimiter | None = None, max_retries: int = EMBEDDING_MAX_RETRIES):
+        self.api = api
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_retries = max_retries
+
+    def _on_failure(self, error: Exception, attempt: int, texts: int) -> float | None:
+        """Delay before retrying a failed send, None if it is not retried."""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        delay = retry_delay(error, attempt)
+        if getattr(error, "status_code", None) == 429:
+            self.rate_limiter.pause(delay)
+        API_RETRIES.labels(self.api).inc()
+        print(f"[WARN] {self.api} call with {texts} texts failed ({type(error).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def _send(self, send, texts: list[str], tokens: int):
+        attempt = 0
+        while True:
+            time.sleep(self.rate_limiter.reserve(tokens))
+            try:
+                with _send_slots:
+                    return send(texts)
+            except Exception as error:
+                delay = self._on_failure(error, attempt, len(texts))
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def _asend(self, send, texts: list[str], tokens: int):
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.rate_limiter.reserve(tokens))
+            try:
+                return await send(texts)
+            except Exception as error:
+                delay = self._on_failure(error, attempt, len(texts))
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def run(self, send, batches: list[tuple[list[str], int]]) -> list:
+        """send(texts) for every (texts, tokens) batch, concurrently, returning the results in batch order."""
+        if len(batches) == 1:
+            return [self._send(send, *batches[0])]
+        # Worker threads run in a copy of the caller's context, so their stage timings reach the caller's request or job
+        futures = [
+            _get_executor().submit(contextvars.copy_context().run, self._send, send, texts, tokens)
+            for texts, tokens in batches
+        ]
+        return [future.result() for future in futures]
+
+    async def arun(self, send, batches: list[tuple[list[str], int]]) -> list:
+        """Async variant of run (concurrency is bounded by the shared OpenAI semaphore, see agents.clients)."""
+        return await asyncio.gather(*(self._asend(send, texts, tokens) for texts, tokens in batches))
@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import fitz  # PyMuPdf, imported on first use
+
+# --------------------- PDF Text Extraction ---------------------
+
+# The PDF is opened once to count pages. Small documents are extracted in that same pass;
+# large ones are split into page ranges extracted in parallel by a process pool
+# (PyMuPDF holds the GIL, so threads would not help). Each worker opens the document from a file path,
+# only the path crosses the process boundary, never the PDF bytes (a temporary file is written when the
+# caller has none).
+# Pages are extracted as text blocks tagged with their region ("header", "footer" or "body", by position
+# against MARGIN_FRACTION of the page height), so running headers and footers can be recognized afterwards
+# (see agents/boilerplate.py).
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARALLEL_EXTRACTION_MIN_PAGES = int(os.getenv("PARALLEL_EXTRACTION_MIN_PAGES", "64"))
+MARGIN_FRACTION = 0.1
+
+# (region, text) of each text block of a page, in reading order
+PageBlocks = list[tuple[str, str]]
+
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn: forking a server process that runs threads (uvicorn, ingestion workers) is unsafe
+        _process_pool = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+
+def page_blocks(page: "fitz.Page") -> PageBlocks:
+    height = page.rect.height
+    blocks = []
+    for x0, y0, x1, y1, text, _block_no, block_type in page.get_text("blocks"):
+        text = text.strip()
+        if block_type != 0 or not text:  # image blocks
+            continue
+        if y1 <= height * MARGIN_FRACTION:
+            region = "header"
+        elif y0 >= height * (1 - MARGIN_FRACTION):
+            region = "footer"
+        else:
+            region = "body"
+        blocks.append((region, text))
+    return blocks
+
+
+def blocks_text(blocks: PageBlocks) -> str:
+    return "\n".join(text for _, text in blocks)
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> tuple[int, list[PageBlocks]]:
+    """Blocks of pages [start, stop), runs in a worker process."""
+    import fitz
+
+    with fitz.open(path) as doc:
+        return start, [page_blocks(doc[page_num]) for page_num in range(start, stop)]
+
+
+def page_ranges(num_pages: int, parts: int) -> list[tuple[int, int]]:
+    """Split [0, num_pages) into at most `parts` contiguous ranges of near-equal size."""
+    parts = max(1, min(parts, num_pages))
+    bounds = [round(i * num_pages / parts) for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts) if bounds[i] < bounds[i + 1]]
+
+
+def extract_page_blocks(file_bytes: bytes, on_progress=None, workers: int = EXTRACTION_WORKERS, path: str | None = None) -> list[PageBlocks]:
+    """
+    Text blocks of every page of a PDF, index i holding page i.
+    on_progress, if given, is called with pages_extracted and total_pages counters.
+    path, if given, is a file holding file_bytes, which parallel workers open instead of receiving the bytes.
+    """
+    import fitz
+
+    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+        num_pages = len(doc)
+
+        if workers <= 1 or num_pages < PARALLEL_EXTRACTION_MIN_PAGES:
+            pages_blocks = []
+            for page in doc:
+                pages_blocks.append(page_blocks(page))
+                if on_progress is not None:
+                    on_progress(pages_extracted=len(pages_blocks), total_pages=num_pages)
+            return pages_blocks
+
+    if path is None:
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+            f.write(file_bytes)
+            f.flush()
+            return _extract_in_pool(f.name, num_pages, on_progress, workers)
+    return _extract_in_pool(path, num_pages, on_progress, workers)
+
+
+def _extract_in_pool(path: str, num_pages: int, on_progress, workers: int) -> list[PageBlocks]:
+    # Several ranges per worker so progress is reported more often than once per worker
+    pages_blocks: list[PageBlocks | None] = [None] * num_pages
+    pages_extracted = 0
+    pool = _get_process_pool()
+    futures = [pool.submit(_extract_page_range, path, start, stop) for start, stop in page_ranges(num_pages, workers * 4)]
+    for future in as_completed(futures):
+        start, blocks = future.result()
+        pages_blocks[start:start + len(blocks)] = blocks
+        pages_extracted += len(blocks)
+        if on_progress is not None:
+            on_progress(pages_extracted=pages_extracted, total_pages=num_pages)
+
+    return pages_blocks
+
+
+def extract_pages(file_bytes: bytes, on_progress=None, workers: int = EXTRACTION_WORKERS) -> list[str]:
+    """Text of every page of a PDF, index i holding page i (blocks joined by newlines, nothing removed)."""
+    return [blocks_text(blocks) for blocks in extract_page_blocks(file_bytes, on_progress, workers)]
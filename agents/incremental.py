@@ -0,0 +1,106 @@
+import os
+import threading
+
+# --------------------- Priority-ordered Incremental Ingestion ---------------------
+
+# After extraction, pages are chunked and embedded in small batches instead of all at once.
+# The page window the user is looking at (the upload's focus page, or the window of the latest
+# query) always goes first; the remaining pages follow by distance from it. A query whose window
+# is ready is answered from those pages straight away, while the rest of the document is still
+# being ingested, so the time to a first answer does not depend on the length of the document.
+# The full index (FAISS + BM25) is only built once every page is done.
+
+INCREMENTAL_BATCH_PAGES = int(os.getenv("INCREMENTAL_BATCH_PAGES", "8"))
+
+
+class IncrementalIngestion:
+    def __init__(self, doc_id: str, num_pages: int, content_hash: str, focus_page: int = 0):
+        self.doc_id = doc_id
+        self.num_pages = num_pages
+        self.content_hash = content_hash
+        self.page_chunks: list[list[str] | None] = [None] * num_pages  # None until the page is done
+        self.page_embeddings: list[list[list[float]] | None] = [None] * num_pages
+        self._pending = set(range(num_pages))
+        self._focus = self._clip(focus_page - 1, focus_page + 1)
+        self._lock = threading.Lock()
+
+    def _clip(self, first_page: int, last_page: int) -> tuple[int, int]:
+        return max(first_page, 0), min(last_page, self.num_pages - 1)
+
+    def prioritize(self, first_page: int, last_page: int):
+        """Make the page window [first_page, last_page] (0-based) the next pages to ingest."""
+        with self._lock:
+            self._focus = self._clip(first_page, last_page)
+
+    def next_batch(self, size: int = INCREMENTAL_BATCH_PAGES) -> list[int]:
+        """
+        Pages to ingest next, in page order: the pending pages of the focus window alone (so it is ready
+        as soon as possible), otherwise up to `size` pending pages closest to it. Empty once all pages are taken.
+        """
+        with self._lock:
+            first_page, last_page = self._focus
+            batch = [page for page in self._pending if first_page <= page <= last_page]
+            if not batch:
+                center = (first_page + last_page) / 2
+                batch = sorted(self._pending, key=lambda page: (abs(page - center), page))[:size]
+            self._pending.difference_update(batch)
+            return sorted(batch)
+
+    def add_pages(self, pages: list[int], page_chunks: list[list[str]], page_embeddings: list[list[list[float]]]):
+        with self._lock:
+            for page, chunks, embeddings in zip(pages, page_chunks, page_embeddings):
+                self.page_chunks[page] = chunks
+                self.page_embeddings[page] = embeddings
+
+    def window_ready(self, first_page: int, last_page: int) -> bool:
+        first_page, last_page = self._clip(first_page, last_page)
+        with self._lock:
+            return all(self.page_chunks[page] is not None for page in range(first_page, last_page + 1))
+
+    def window(self, first_page: int, last_page: int) -> tuple[list[list[str]], list[list[list[float]]]]:
+        """
+        (page_chunks, page_embeddings) covering every page of the document, where only the pages of the
+        window that are done have chunks; all other pages are empty, so page numbers stay aligned.
+        """
+        first_page, last_page = self._clip(first_page, last_page)
+        with self._lock:
+            page_chunks = [
+                (self.page_chunks[page] or []) if first_page <= page <= last_page else []
+                for page in range(self.num_pages)
+            ]
+            page_embeddings = [
+                (self.page_embeddings[page] or []) if first_page <= page <= last_page else []
+                for page in range(self.num_pages)
+            ]
+        return page_chunks, page_embeddings
+
+    def pages_done(self) -> int:
+        with self._lock:
+            return sum(1 for chunks in self.page_chunks if chunks is not None)
+
+    def result(self) -> tuple[list[list[str]], list[list[list[float]]]]:
+        """Chunks and embeddings of every page, once all pages are done"""
+        with self._lock:
+            if any(chunks is None for chunks in self.page_chunks):
+                raise RuntimeError(f"Ingestion of {self.doc_id} is not complete")
+            return list(self.page_chunks), list(self.page_embeddings)
+
+
+class IngestionTracker:
+    """Documents being ingested, by doc_id, so queries can be served from the pages already done."""
+
+    def __init__(self):
+        self._ingestions: dict[str, IncrementalIngestion] = {}
+        self._lock = threading.Lock()
+
+    def start(self, ingestion: IncrementalIngestion):
+        with self._lock:
+            self._ingestions[ingestion.doc_id] = ingestion
+
+    def get(self, doc_id: str) -> IncrementalIngestion | None:
+        with self._lock:
+            return self._ingestions.get(doc_id)
+
+    def finish(self, doc_id: str):
+        with self._lock:
+            self._ingestions.pop(doc_id, None)
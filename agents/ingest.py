@@ -0,0 +1,87 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.chunking import CHUNKING_STRATEGIES, CHUNKING_STRATEGY, chunk_text_by_tokens, chunk_text_with_embeddings
+from agents.boilerplate import NearDuplicateFilter
+from agents.embed import get_embeddings
+from agents.embedding_scheduler import EMBEDDING_CONCURRENCY
+
+# --------------------- Single-pass Ingestion Pipeline ---------------------
+
+# The semantic chunker already embeds every sentence group of a page to find its breakpoints.
+# Instead of embedding the resulting chunks a second time, chunk vectors are pooled from those
+# sentence embeddings. Only chunks the chunker never embedded (e.g. single-sentence pages) are
+# embedded afterwards, in one batched call for the whole document.
+# With the "token" chunking strategy no chunk has a vector yet, so every chunk goes through that batched call.
+# Semantic chunking waits on one embedding call per page, so EMBEDDING_CONCURRENCY pages are chunked at once
+# (the embedding scheduler keeps their calls within the rate limits).
+# Chunks that near-duplicate a chunk of another page (see agents/boilerplate.py) are dropped before embedding.
+
+def _chunk_page(page_text: str, strategy: str) -> tuple[list[str], list[list[float] | None]]:
+    if not page_text.strip():
+        return [], []
+    if strategy == "token":
+        chunks = chunk_text_by_tokens(page_text)
+        return chunks, [None] * len(chunks)
+    return chunk_text_with_embeddings(page_text)
+
+
+def _chunk_pages(page_texts: list[str], strategy: str):
+    """Yields (chunks, vectors) of every page, in page order"""
+    if strategy != "semantic" or len(page_texts) <= 1:
+        for page_text in page_texts:
+            yield _chunk_page(page_text, strategy)
+        return
+    # Pages run in copies of the caller's context, so their stage timings reach its job
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY) as pool:
+        yield from pool.map(lambda page_text: context.copy().run(_chunk_page, page_text, strategy), page_texts)
+
+
+def chunk_and_embed_pages(
+    page_texts: list[str],
+    on_progress=None,
+    strategy: str = CHUNKING_STRATEGY,
+    duplicates: NearDuplicateFilter | None = None,
+    page_numbers: list[int] | None = None,
+) -> tuple[list[list[str]], list[list[list[float]]]]:
+    """
+    Chunk every page with the given strategy and return the chunks together with their embeddings.
+    Returns (page_chunks, page_embeddings) where page_embeddings[p][i] is the vector of page_chunks[p][i].
+    on_progress, if given, is called with keyword counters (pages_chunked, chunks_embedded) as pages complete.
+    duplicates, if given, drops near-duplicate chunks across pages, and can be shared by successive calls on the
+    same document; page_numbers are then the document pages of page_texts (default 0..n-1).
+    """
+    if strategy not in CHUNKING_STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy {strategy!r}, expected one of {CHUNKING_STRATEGIES}")
+
+    chunks_embedded = 0
+    page_chunks: list[list[str]] = []
+    page_embeddings: list[list[list[float] | None]] = []
+    missing: list[tuple[int, int]] = []  # (page, chunk) positions still needing an embedding
+
+    for page_num, (chunks, vectors) in enumerate(_chunk_pages(page_texts, strategy)):
+        # Drop empty chunks, the embeddings API rejects empty input
+        kept = [(chunk, vector) for chunk, vector in zip(chunks, vectors) if chunk.strip()]
+        if duplicates is not None:
+            page = page_numbers[page_num] if page_numbers is not None else page_num
+            kept = [(chunk, vector) for chunk, vector in kept if not duplicates.is_duplicate(chunk, page)]
+        page_chunks.append([chunk for chunk, _ in kept])
+        page_embeddings.append([vector for _, vector in kept])
+
+        missing.extend(
+            (page_num, chunk_idx) for chunk_idx, (_, vector) in enumerate(kept) if vector is None
+        )
+        chunks_embedded += sum(1 for _, vector in kept if vector is not None)
+        if on_progress is not None:
+            on_progress(pages_chunked=page_num + 1, chunks_embedded=chunks_embedded)
+
+    if missing:
+        vectors = get_embeddings([page_chunks[p][i] for p, i in missing])
+        for (p, i), vector in zip(missing, vectors):
+            page_embeddings[p][i] = vector
+        if on_progress is not None:
+            on_progress(chunks_embedded=chunks_embedded + len(missing))
+
+    print(f"[INFO] Embedded {sum(len(c) for c in page_chunks)} chunks ({len(missing)} needed a separate embedding call)")
+    return page_chunks, page_embeddings
@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from agents.metrics import collect_timings, format_timings, record_stage
+
+# --------------------- Background Ingestion Jobs ---------------------
+
+# Uploads are processed by a small worker pool instead of inside the request handler,
+# so the event loop keeps serving queries while a large document is ingested.
+# Each job reports its current stage, per-stage progress counters and the duration of every
+# finished stage (plus time spent in embedding calls), polled via /jobs/{id}.
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+MAX_FINISHED_JOBS = int(os.getenv("MAX_FINISHED_JOBS", "1000"))
+
+
+class IngestionJob:
+    def __init__(self, doc_id: str, filename: str | None = None):
+        self.job_id = uuid4().hex
+        self.doc_id = doc_id
+        self.filename = filename
+        self.status = "queued"  # queued -> running -> done | failed
+        self.stage = None  # extract -> chunk_and_embed -> index -> persist
+        self.progress: dict[str, int] = {}
+        self.timings: dict[str, float] = {}  # stage -> seconds
+        self._stage_started = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def set_stage(self, stage: str):
+        """Enter the next stage, timing the one that just ended."""
+        with self._lock:
+            self._finish_stage()
+            self.stage = stage
+            self._stage_started = time.perf_counter()
+
+    def finish_stage(self):
+        """Time the last stage once the job's work is over (the stage name is kept for display)."""
+        with self._lock:
+            self._finish_stage()
+
+    def _finish_stage(self):
+        if self.stage is not None and self._stage_started is not None:
+            record_stage(self.stage, time.perf_counter() - self._stage_started)
+        self._stage_started = None
+
+    def update(self, **counters: int):
+        """Set progress counters, e.g. update(pages_extracted=10, total_pages=300)"""
+        with self._lock:
+            self.progress.update(counters)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "doc_id": self.doc_id,
+                "filename": self.filename,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": dict(self.progress),
+                "timings_ms": {stage: round(seconds * 1000, 1) for stage, seconds in dict(self.timings).items()},
+                "error": self.error,
+                "elapsed_seconds": round((self.finished_at or time.time()) - self.created_at, 3),
+            }
+
+
+class JobManager:
+    def __init__(self, max_workers: int = INGESTION_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs: OrderedDict[str, IngestionJob] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, job: IngestionJob, fn, *args) -> IngestionJob:
+        """Run fn(job, *args) on the worker pool; fn reports progress through the job."""
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn, *args)
+        return job
+
+    def _run(self, job: IngestionJob, fn, *args):
+        job.status = "running"
+        with collect_timings(job.timings):
+            try:
+                fn(job, *args)
+                job.finish_stage()
+                job.status = "done"
+                print(f"[INFO] Ingested {job.doc_id} stages={format_timings(job.timings)}")
+            except Exception as e:
+                traceback.print_exc()
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+
+    def _prune(self):
+        # Keep every unfinished job and at most MAX_FINISHED_JOBS finished ones (oldest dropped first)
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> IngestionJob | None:
+        return self._jobs.get(job_id)
+
+    def job_for_document(self, doc_id: str) -> IngestionJob | None:
+        """Most recent job that ingests doc_id"""
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.doc_id == doc_id:
+                    return job
+        return None
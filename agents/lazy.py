@@ -0,0 +1,79 @@
+import functools
+import importlib
+import os
+import threading
+import time
+
+# --------------------- Lazy Resources ---------------------
+
+# The OpenAI SDK, LangChain's SemanticChunker, FAISS and PyMuPDF take over a second to import, and
+# clients and the chunker used to be created at import time, so the server could not answer anything
+# (not even a health check) until all of them were loaded. They are now imported on first use only,
+# and shared objects are created by factories registered here with @lazy_resource: the first call
+# creates the object (once, under a lock), later calls return it.
+# After startup, warm_up() loads everything in a background thread, so the first upload or query
+# does not pay for the imports either, while /health is answered right away.
+
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "1") == "1"
+
+# Modules imported by warm_up, besides the registered resources
+HEAVY_MODULES = ("openai", "langchain_experimental.text_splitter", "faiss", "fitz")
+
+_getters: dict = {}  # name -> getter returned by lazy_resource
+_instances: dict = {}  # name -> created object
+_locks: dict[str, threading.Lock] = {}  # one per resource, so a slow factory does not hold up the others
+_warm_up_seconds: float | None = None
+
+
+def lazy_resource(name: str):
+    """Register the decorated factory as resource `name` and return a getter creating it on first call."""
+
+    def decorator(factory):
+        _locks[name] = threading.Lock()
+
+        @functools.wraps(factory)
+        def get():
+            if name not in _instances:
+                with _locks[name]:
+                    if name not in _instances:
+                        _instances[name] = factory()
+            return _instances[name]
+
+        _getters[name] = get
+        return get
+
+    return decorator
+
+
+def warm_up():
+    """Import HEAVY_MODULES and create every registered resource."""
+    global _warm_up_seconds
+    start = time.perf_counter()
+    for module in HEAVY_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"[WARN] Warm-up could not import {module}: {e}")
+    for name, get in list(_getters.items()):
+        try:
+            get()
+        except Exception as e:
+            print(f"[WARN] Warm-up could not create {name}: {e}")
+    _warm_up_seconds = time.perf_counter() - start
+    print(f"[INFO] Warm-up done in {_warm_up_seconds:.2f}s")
+
+
+def start_warm_up() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def resource_stats() -> dict:
+    loaded = sorted(name for name in _getters if name in _instances)
+    return {
+        "ready": _warm_up_seconds is not None or len(loaded) == len(_getters),
+        "resources_loaded": loaded,
+        "resources_pending": sorted(name for name in _getters if name not in _instances),
+        "warm_up_seconds": None if _warm_up_seconds is None else round(_warm_up_seconds, 3),
+    }
@@ -0,0 +1,134 @@
+import hashlib
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from agents.vector_index import build_page_offsets, ids_to_pages
+
+# --------------------- BM25 Lexical Index ---------------------
+
+# A per-document inverted index over the page chunks, built at ingestion with no API calls.
+# Chunks keep the same global ids as the FAISS index (page by page), so the same page offset
+# table restricts a search to a page window. Postings are sorted by chunk id, which turns the
+# window restriction into two binary searches per query term. All postings live in a few flat
+# numpy arrays (CSR layout, terms looked up by their 64-bit hash), so the index size is exactly
+# what memory_footprint reports, with no per-term dicts, strings or tuples.
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Words, plus compound tokens such as part numbers ("SN-4471", "v2.3") kept whole alongside their parts
+_COMPOUND_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)+")
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    text = text.lower()
+    return _WORD_PATTERN.findall(text) + _COMPOUND_PATTERN.findall(text)
+
+
+def term_hash(term: str) -> int:
+    """Stable 64-bit hash of a term: vocabularies are kept as sorted hashes instead of Python strings"""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class BM25Index:
+    def __init__(self, page_chunks: list[list[str]]):
+        self.page_offsets = build_page_offsets(page_chunks)
+        chunk_terms = [Counter(tokenize(chunk)) for chunks in page_chunks for chunk in chunks]
+
+        self.num_chunks = len(chunk_terms)
+        self.chunk_lengths = np.array([sum(terms.values()) for terms in chunk_terms], dtype=np.float32)
+        self.average_length = float(self.chunk_lengths.mean()) if self.num_chunks else 0.0
+
+        postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        for chunk_id, terms in enumerate(chunk_terms):
+            for term, count in terms.items():
+                postings[term].append((chunk_id, count))
+
+        # Postings in CSR form: row r is the r-th term by hash, its chunk ids (sorted) and term frequencies
+        # are posting_ids / posting_counts[term_offsets[r]:term_offsets[r + 1]]
+        entries = sorted((term_hash(term), term_postings) for term, term_postings in postings.items())
+        self.term_hashes = np.array([h for h, _ in entries], dtype=np.uint64)
+        self.term_offsets = np.concatenate(([0], np.cumsum([len(p) for _, p in entries], dtype=np.int64))).astype(np.int64)
+        self.posting_ids = np.array([chunk_id for _, p in entries for chunk_id, _ in p], dtype=np.int32)
+        self.posting_counts = np.array([count for _, p in entries for _, count in p], dtype=np.float32)
+        df = np.diff(self.term_offsets)
+        self.idf = np.log(1 + (self.num_chunks - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    # Fields stored with the document (agents/document_store.py), so a stored document is not re-tokenized on load
+    _ARRAYS = ("chunk_lengths", "term_hashes", "term_offsets", "posting_ids", "posting_counts", "idf")
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in self._ARRAYS}
+
+    @classmethod
+    def from_arrays(cls, page_offsets: np.ndarray, arrays: dict[str, np.ndarray]) -> "BM25Index":
+        index = cls.__new__(cls)
+        index.page_offsets = page_offsets
+        for name in cls._ARRAYS:
+            setattr(index, name, arrays[name])
+        index.num_chunks = len(index.chunk_lengths)
+        index.average_length = float(index.chunk_lengths.mean()) if index.num_chunks else 0.0
+        return index
+
+    def _term_rows(self, terms: list[str]) -> list[int]:
+        """Rows of the terms that occur in the document"""
+        if not terms or not len(self.term_hashes):
+            return []
+        hashes = np.array([term_hash(term) for term in terms], dtype=np.uint64)
+        rows = np.minimum(np.searchsorted(self.term_hashes, hashes), len(self.term_hashes) - 1)
+        return rows[self.term_hashes[rows] == hashes].tolist()
+
+    def search(self, query: str, first_page: int, last_page: int, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k chunks by BM25 score within the page window (0-based, clipped). Returns (scores, ids), best first."""
+        num_pages = len(self.page_offsets) - 1
+        first_page, last_page = max(first_page, 0), min(last_page, num_pages - 1)
+        if first_page > last_page:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        lo, hi = int(self.page_offsets[first_page]), int(self.page_offsets[last_page + 1])
+        scores = np.zeros(hi - lo, dtype=np.float32)
+
+        for row in self._term_rows(list(set(tokenize(query)))):
+            ids = self.posting_ids[self.term_offsets[row]:self.term_offsets[row + 1]]
+            counts = self.posting_counts[self.term_offsets[row]:self.term_offsets[row + 1]]
+            start, stop = np.searchsorted(ids, lo), np.searchsorted(ids, hi)
+            if start == stop:
+                continue
+            window_ids, tf = ids[start:stop], counts[start:stop]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.chunk_lengths[window_ids] / self.average_length)
+            scores[window_ids - lo] += self.idf[row] * tf * (BM25_K1 + 1) / (tf + norm)
+
+        matched = np.flatnonzero(scores > 0)
+        top = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+        return scores[top], (top + lo).astype(np.int64)
+
+    def search_pages(self, query: str, first_page: int, last_page: int, k: int) -> list[tuple[int, int, float]]:
+        """Same as search, as (page, chunk index in page, score) tuples"""
+        scores, ids = self.search(query, first_page, last_page, k)
+        pages, chunk_indices = ids_to_pages(self.page_offsets, ids)
+        return [(int(p), int(i), float(s)) for p, i, s in zip(pages, chunk_indices, scores)]
+
+    def memory_footprint(self) -> int:
+        """Bytes held by the index arrays (there are no per-term Python objects)"""
+        arrays = (self.page_offsets, self.chunk_lengths, self.term_hashes, self.term_offsets, self.posting_ids, self.posting_counts, self.idf)
+        return int(sum(array.nbytes for array in arrays))
+
+
+# --------------------- Hybrid Fusion ---------------------
+
+RRF_K = 60  # damping constant of reciprocal rank fusion, 60 is the usual choice
+
+
+def reciprocal_rank_fusion(rankings: list[list[tuple[int, int]]], k: int, rrf_k: int = RRF_K) -> list[tuple[int, int]]:
+    """
+    Fuse several best-first rankings of (page, chunk index) keys into one, scoring each key by
+    sum(1 / (rrf_k + rank)). Rank-based, so dense distances and BM25 scores need no normalization.
+    """
+    fused: dict[tuple[int, int], float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            fused[key] += 1.0 / (rrf_k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)[:k]
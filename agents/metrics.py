@@ -0,0 +1,194 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# --------------------- Metrics and Stage Timings ---------------------
+
+# Every pipeline stage is timed with `with timed("stage"):`, which
+#   - observes the askmydoc_stage_seconds{stage} histogram served at /metrics, and
+#   - adds the duration to the timings of the current request or ingestion job (if any),
+#     so a single slow query can be broken down into query_embedding / retrieval / llm.
+# Stages: extract, chunk_and_embed, index, persist (ingestion), embed (every embedding call),
+# query_embedding, retrieval, llm, llm_first_token (queries).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram("askmydoc_stage_seconds", "Duration of pipeline stages", ["stage"], buckets=LATENCY_BUCKETS)
+REQUEST_SECONDS = Histogram(
+    "askmydoc_http_request_seconds", "Duration of HTTP requests, until the last body byte is sent",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+API_CALLS = Counter("askmydoc_api_calls_total", "Calls to external model APIs", ["api", "outcome"])
+API_RETRIES = Counter("askmydoc_api_retries_total", "Retried calls to external model APIs", ["api"])
+API_CALL_SECONDS = Histogram("askmydoc_api_call_seconds", "Duration of calls to external model APIs", ["api"], buckets=LATENCY_BUCKETS)
+EMBEDDING_BATCH_TEXTS = Histogram(
+    "askmydoc_embedding_batch_size", "Texts per embedding provider call", ["provider"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048),
+)
+TOKENS = Counter("askmydoc_tokens_total", "Tokens reported by the model APIs", ["kind"])  # embedding, prompt, completion
+SELECTION_QUERIES = Counter("askmydoc_selection_queries_total", "Extension queries by how their context was found", ["source"])  # selection, retrieval
+
+class _TimingCollector:
+    """
+    Stage timings of one request or ingestion job. Stages can repeat (e.g. several embedding batches) and run
+    concurrently on worker threads; a stage's time is the wall-clock time during which at least one of its
+    runs was busy (the union of their intervals), so overlapping runs are not counted twice.
+    """
+
+    def __init__(self, timings: dict):
+        self.timings = timings  # stage -> seconds
+        self._busy: dict[str, list[list[float]]] = {}  # stage -> disjoint [start, end] intervals, sorted
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, start: float, end: float):
+        with self._lock:
+            merged = []
+            for interval in self._busy.get(stage, []):
+                if interval[1] < start or interval[0] > end:
+                    merged.append(interval)
+                else:
+                    start, end = min(start, interval[0]), max(end, interval[1])
+            merged.append([start, end])
+            merged.sort()
+            self._busy[stage] = merged
+            self.timings[stage] = sum(interval_end - interval_start for interval_start, interval_end in merged)
+
+
+# Timings of the request or job being handled (None outside of one)
+_current_timings: contextvars.ContextVar[_TimingCollector | None] = contextvars.ContextVar("askmydoc_timings", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    """Record a stage run of `seconds` that ends now"""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    collector = _current_timings.get()
+    if collector is not None:
+        end = time.perf_counter()
+        collector.add(stage, end - seconds, end)
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def collect_timings(timings: dict):
+    """Route the stage timings recorded in this context (and tasks/threads started from it) into `timings`."""
+    token = _current_timings.set(_TimingCollector(timings))
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+@contextmanager
+def api_call(api: str):
+    """Count and time one call to an external API, labelled by outcome (ok / error)."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        API_CALLS.labels(api, "error").inc()
+        raise
+    else:
+        API_CALLS.labels(api, "ok").inc()
+    finally:
+        API_CALL_SECONDS.labels(api).observe(time.perf_counter() - start)
+
+
+def record_usage(usage):
+    """Add the token counts of an OpenAI response's usage object (if the response has one)."""
+    if usage is None:
+        return
+    if getattr(usage, "completion_tokens", None) is None:
+        TOKENS.labels("embedding").inc(usage.total_tokens or 0)
+    else:
+        TOKENS.labels("prompt").inc(usage.prompt_tokens or 0)
+        TOKENS.labels("completion").inc(usage.completion_tokens or 0)
+
+
+def format_timings(timings: dict) -> str:
+    return json.dumps({stage: round(seconds * 1000, 1) for stage, seconds in timings.items()})
+
+
+# --------------------- HTTP Request Timing ---------------------
+
+class RequestTimingMiddleware:
+    """
+    ASGI middleware timing every request until its last body chunk is sent (so streamed answers are
+    timed in full). Routes are labelled by their path template (/jobs/{job_id}), not the raw path.
+    Requests other than GET are logged with their stage timings in milliseconds.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with collect_timings({}) as timings:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                elapsed = time.perf_counter() - start
+                route = getattr(scope.get("route"), "path", "unmatched")
+                REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(elapsed)
+                if scope["method"] != "GET":
+                    print(f"[INFO] {scope['method']} {route} {status} {elapsed * 1000:.1f}ms stages={format_timings(timings)}")
+
+
+# --------------------- Cache and Registry Counters ---------------------
+
+class StatsCollector:
+    """
+    Exposes the counters the caches and the document registry already keep (their stats() dicts)
+    at scrape time, instead of mirroring every hit into a second counter.
+    """
+
+    def __init__(self, embedding_cache, query_embedding_cache, answer_cache, document_registry):
+        self.embedding_cache = embedding_cache
+        self.query_embedding_cache = query_embedding_cache
+        self.answer_cache = answer_cache
+        self.document_registry = document_registry
+
+    def collect(self):
+        lookups = CounterMetricFamily("askmydoc_cache_lookups", "Cache lookups by cache and result", labels=["cache", "result"])
+        memory = GaugeMetricFamily("askmydoc_embedding_cache_bytes", "Memory held by the in-process tier of the embedding caches", labels=["cache"])
+        for cache_name, cache in (("embedding", self.embedding_cache), ("query_embedding", self.query_embedding_cache)):
+            stats = cache.stats()
+            lookups.add_metric([cache_name, "memory_hit"], stats["memory_hits"])
+            lookups.add_metric([cache_name, "disk_hit"], stats["disk_hits"])
+            lookups.add_metric([cache_name, "miss"], stats["misses"])
+            memory.add_metric([cache_name], stats["memory_bytes"])
+        stats = self.answer_cache.stats()
+        lookups.add_metric(["answer", "exact_hit"], stats["exact_hits"])
+        lookups.add_metric(["answer", "similar_hit"], stats["similar_hits"])
+        lookups.add_metric(["answer", "miss"], stats["misses"])
+        yield lookups
+        yield memory
+
+        stats = self.document_registry.stats()
+        yield GaugeMetricFamily("askmydoc_documents_loaded", "Documents held in memory", value=stats["documents"])
+        yield GaugeMetricFamily("askmydoc_documents_bytes", "Approximate memory held by loaded documents", value=stats["total_bytes"])
+        yield CounterMetricFamily("askmydoc_document_evictions", "Documents evicted from memory", value=stats["evictions"])
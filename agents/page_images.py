@@ -0,0 +1,59 @@
+import os
+import threading
+from collections import OrderedDict
+
+# --------------------- Page Rendering ---------------------
+
+# Pages of stored PDFs are rendered to PNG on demand, at a requested width (full pages or thumbnails).
+# Rendered images are kept in an in-process LRU bounded by PAGE_IMAGE_CACHE_BYTES, keyed by
+# (PDF path, page, width): stored PDFs never change, so cached images never go stale.
+
+PAGE_IMAGE_CACHE_BYTES = int(os.getenv("PAGE_IMAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+MAX_PAGE_IMAGE_WIDTH = 2000
+
+
+def render_page_png(pdf_path: str, page_index: int, width: int) -> bytes:
+    """PNG of one page (0-based) scaled to `width` pixels. Raises IndexError for pages outside the document."""
+    import fitz  # PyMuPdf
+
+    with fitz.open(pdf_path) as doc:
+        if not 0 <= page_index < len(doc):
+            raise IndexError(f"Page {page_index + 1} out of range ({len(doc)} pages)")
+        page = doc[page_index]
+        zoom = width / page.rect.width
+        return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png")
+
+
+class PageImageCache:
+    def __init__(self, max_bytes: int = PAGE_IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._images: OrderedDict[tuple[str, int, int], bytes] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, pdf_path: str, page_index: int, width: int) -> bytes:
+        key = (pdf_path, page_index, width)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        # Rendered outside the lock, concurrent misses for one page may render it twice
+        image = render_page_png(pdf_path, page_index, width)
+        with self._lock:
+            if key not in self._images:
+                self._images[key] = image
+                self._total_bytes += len(image)
+            while self._total_bytes > self.max_bytes and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self._total_bytes -= len(evicted)
+        return image
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"images": len(self._images), "total_bytes": self._total_bytes, "hits": self.hits, "misses": self.misses}
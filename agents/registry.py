@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+# --------------------- Document Registry ---------------------
+
+# Holds every ingested document of this process under its own doc_id, so concurrent users
+# no longer overwrite each other. Each entry records its approximate memory footprint and
+# when the registry exceeds its byte budget, the least-recently-queried documents are evicted.
+
+DOCUMENT_MEMORY_BUDGET_MB = float(os.getenv("DOCUMENT_MEMORY_BUDGET_MB", "512"))
+
+
+class RegistryEntry:
+    __slots__ = ("document", "nbytes", "last_used")
+
+    def __init__(self, document, nbytes: int):
+        self.document = document
+        self.nbytes = nbytes
+        self.last_used = time.time()
+
+
+class DocumentRegistry:
+    def __init__(self, max_bytes: int = int(DOCUMENT_MEMORY_BUDGET_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, RegistryEntry] = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def add(self, document, nbytes: int, doc_id: str | None = None) -> str:
+        """Register a document and return its doc_id, evicting older documents if over budget."""
+        doc_id = doc_id or uuid4().hex
+        with self._lock:
+            if doc_id in self._entries:
+                self.total_bytes -= self._entries.pop(doc_id).nbytes
+            self._entries[doc_id] = RegistryEntry(document, nbytes)
+            self.total_bytes += nbytes
+            self._evict(keep=doc_id)
+        return doc_id
+
+    def get(self, doc_id: str):
+        """Return the document for doc_id (or None) and mark it as most recently used."""
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is None:
+                return None
+            entry.last_used = time.time()
+            self._entries.move_to_end(doc_id)
+            return entry.document
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.pop(doc_id, None)
+            if entry is None:
+                return False
+            self.total_bytes -= entry.nbytes
+            return True
+
+    def _evict(self, keep: str):
+        # The document that was just added is never evicted, even if it alone exceeds the budget
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            doc_id, entry = next(iter(self._entries.items()))
+            if doc_id == keep:
+                self._entries.move_to_end(doc_id)
+                continue
+            del self._entries[doc_id]
+            self.total_bytes -= entry.nbytes
+            self.evictions += 1
+            print(f"[INFO] Evicted document {doc_id} ({entry.nbytes} bytes) from the registry")
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents": len(self._entries),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,112 @@
+import os
+import re
+import sys
+import unicodedata
+
+import numpy as np
+
+from agents.chunk_store import ChunkStore
+
+# --------------------- Selection Index ---------------------
+
+# "Explain this highlighted passage" does not need retrieval: the passage is in the document. Every
+# document keeps its chunk texts normalized (NFKC, lowercase, words only, single spaces) and joined
+# into one string, with the offset at which each chunk starts. A selection, normalized the same way,
+# is located with a substring search, so PDF viewer artifacts (line breaks, hyphenation, ligatures,
+# punctuation) do not matter, and no query embedding is needed. A selection found several times is
+# taken on the page closest to the one the user is looking at. A selection not found as a whole
+# (it spans text dropped as boilerplate, or a page break) is located by its first and last
+# SELECTION_ANCHOR_WORDS words. The context is then the matching chunks plus SELECTION_NEIGHBOR_CHUNKS
+# chunks on either side.
+
+SELECTION_MIN_CHARS = int(os.getenv("SELECTION_MIN_CHARS", "12"))  # shorter selections match too many places
+SELECTION_ANCHOR_WORDS = int(os.getenv("SELECTION_ANCHOR_WORDS", "8"))
+SELECTION_NEIGHBOR_CHUNKS = int(os.getenv("SELECTION_NEIGHBOR_CHUNKS", "1"))
+SELECTION_MAX_OCCURRENCES = 64
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(_WORD_PATTERN.findall(unicodedata.normalize("NFKC", text).lower()))
+
+
+class SelectionIndex:
+    def __init__(self, chunks: ChunkStore):
+        texts = [normalize_text(chunks.text(chunk_id)) for chunk_id in range(len(chunks))]
+        # Chunks are joined by a space, so a selection running over a chunk boundary is found too
+        self.text = " ".join(texts)
+        self.chunk_starts = np.cumsum([0] + [len(text) + 1 for text in texts], dtype=np.int64)
+        self.chunk_pages = chunks.chunk_pages
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """Fields stored with the document (agents/document_store.py), so a stored document is not re-normalized on load"""
+        return {"text": np.frombuffer(self.text.encode("utf-8"), dtype=np.uint8), "chunk_starts": self.chunk_starts}
+
+    @classmethod
+    def from_arrays(cls, chunks: ChunkStore, arrays: dict[str, np.ndarray]) -> "SelectionIndex":
+        index = cls.__new__(cls)
+        index.text = arrays["text"].tobytes().decode("utf-8")
+        index.chunk_starts = arrays["chunk_starts"]
+        index.chunk_pages = chunks.chunk_pages
+        return index
+
+    def _chunk_at(self, position: int) -> int:
+        return int(np.searchsorted(self.chunk_starts, position, side="right")) - 1
+
+    def _locate(self, needle: str, page: int | None, start: int = 0, end: int | None = None) -> int | None:
+        """Position of the occurrence of needle in text[start:end] on the page closest to page (the first one if page is None)"""
+        best, best_distance = None, None
+        position = self.text.find(needle, start, end)
+        for _ in range(SELECTION_MAX_OCCURRENCES):
+            if position < 0:
+                break
+            if page is None:
+                return position
+            distance = abs(int(self.chunk_pages[self._chunk_at(position)]) - page)
+            if best is None or distance < best_distance:
+                best, best_distance = position, distance
+                if distance == 0:
+                    break
+            position = self.text.find(needle, position + 1, end)
+        return best
+
+    def find(self, selection: str, page: int | None = None) -> tuple[int, int] | None:
+        """
+        (first, last) ids of the chunks holding the selected text, preferring occurrences near page (0-based),
+        or None if it is too short or not in the document.
+        """
+        needle = normalize_text(selection)
+        if len(needle) < SELECTION_MIN_CHARS:
+            return None
+
+        start = self._locate(needle, page)
+        if start is not None:
+            end = start + len(needle) - 1
+        else:
+            words = needle.split(" ")
+            if len(words) < 2 * SELECTION_ANCHOR_WORDS:
+                return None
+            head, tail = " ".join(words[:SELECTION_ANCHOR_WORDS]), " ".join(words[-SELECTION_ANCHOR_WORDS:])
+            start = self._locate(head, page)
+            if start is None:
+                # Only the end of the selection is in the document
+                start = self._locate(tail, page)
+                if start is None:
+                    return None
+                end = start + len(tail) - 1
+            else:
+                # The end is looked for shortly after the start, the selection may have lost or gained some text in between
+                tail_start = self.text.find(tail, start + len(head), start + 2 * len(needle))
+                end = tail_start + len(tail) - 1 if tail_start >= 0 else start + len(head) - 1
+        return self._chunk_at(start), self._chunk_at(end)
+
+    def context_chunk_ids(self, first: int, last: int, neighbors: int = SELECTION_NEIGHBOR_CHUNKS) -> list[int]:
+        """The matched chunks in order, then their neighbors nearest first (before, after, ...), within the document"""
+        chunk_ids = list(range(first, last + 1))
+        for distance in range(1, neighbors + 1):
+            chunk_ids += [chunk_id for chunk_id in (first - distance, last + distance) if 0 <= chunk_id < len(self.chunk_pages)]
+        return chunk_ids
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.text) + self.chunk_starts.nbytes
@@ -0,0 +1,76 @@
+from langchain_core.embeddings import Embeddings
+from langchain_experimental.text_splitter import SemanticChunker
+
+from agents.chunking import pool_embeddings
+from agents.embed_cache import EmbeddingCache, cached_embed
+from agents.embedding_providers import EmbeddingProvider
+
+# --------------------- LangChain Semantic Chunker ---------------------
+
+# Kept out of agents/chunking.py because importing LangChain takes a few hundred milliseconds:
+# this module is only imported when the semantic chunker is first used (see get_semantic_chunker).
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain Embeddings adapter over an embedding provider, routing every call through the shared embedding cache."""
+
+    def __init__(self, provider: EmbeddingProvider, cache: EmbeddingCache):
+        self.provider = provider
+        self.cache = cache
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return cached_embed(self.cache, self.provider.name, texts, self.provider.embed)
+
+    def embed_query(self, text: str) -> list[float]:
+        return cached_embed(self.cache, self.provider.name, [text], self.provider.embed)[0]
+
+
+class EmbeddingSemanticChunker(SemanticChunker):
+    """
+    SemanticChunker that keeps the sentence-group embeddings it computes to find breakpoints,
+    so that every chunk also gets a vector without a second embedding call.
+    """
+
+    def split_text_with_embeddings(self, text: str) -> tuple[list[str], list[list[float] | None]]:
+        """
+        Same splitting as SemanticChunker.split_text, but also returns one vector per chunk,
+        mean-pooled (and re-normalized) from the combined sentence embeddings of that chunk.
+        A chunk's vector is None when the splitter returned early without embedding anything.
+        """
+        single_sentences_list = self._get_single_sentences_list(text)
+
+        # Mirrors the early returns of SemanticChunker.split_text (nothing was embedded)
+        if len(single_sentences_list) == 1 or (
+            self.breakpoint_threshold_type == "gradient" and len(single_sentences_list) == 2
+        ):
+            return single_sentences_list, [None] * len(single_sentences_list)
+
+        distances, sentences = self._calculate_sentence_distances(single_sentences_list)
+        if self.number_of_chunks is not None:
+            breakpoint_distance_threshold = self._threshold_from_clusters(distances)
+            breakpoint_array = distances
+        else:
+            breakpoint_distance_threshold, breakpoint_array = self._calculate_breakpoint_threshold(distances)
+
+        indices_above_thresh = [
+            i for i, x in enumerate(breakpoint_array) if x > breakpoint_distance_threshold
+        ]
+
+        chunks, vectors = [], []
+        start_index = 0
+
+        for index in indices_above_thresh:
+            group = sentences[start_index : index + 1]
+            combined_text = " ".join([d["sentence"] for d in group])
+            if self.min_chunk_size is not None and len(combined_text) < self.min_chunk_size:
+                continue
+            chunks.append(combined_text)
+            vectors.append(pool_embeddings([d["combined_sentence_embedding"] for d in group]))
+            start_index = index + 1
+
+        if start_index < len(sentences):
+            group = sentences[start_index:]
+            chunks.append(" ".join([d["sentence"] for d in group]))
+            vectors.append(pool_embeddings([d["combined_sentence_embedding"] for d in group]))
+
+        return chunks, vectors
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from agents.tokens import count_tokens, truncate_tokens
+
+# --------------------- Server-side Conversation Sessions ---------------------
+
+# A session holds one conversation about one document, so clients send only the new message.
+# The most recent turns are kept verbatim. Once they exceed SESSION_RECENT_TOKENS, the oldest
+# ones are folded into a rolling summary by one small LLM call: the call sees the previous summary
+# and the turns being folded, never the whole conversation, so its cost does not grow with length.
+# The prompt history of a session is then [summary] + recent turns, a bounded size at every turn.
+# Sessions live in memory, least recently used ones are dropped beyond MAX_SESSIONS or after
+# SESSION_TTL_SECONDS of inactivity.
+
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "10000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(6 * 3600)))
+SESSION_RECENT_TOKENS = int(os.getenv("SESSION_RECENT_TOKENS", "1000"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "400"))
+
+
+class ConversationSession:
+    def __init__(self, doc_id: str):
+        self.session_id = uuid4().hex
+        self.doc_id = doc_id
+        self.summary = ""
+        self.turns: list[dict] = []  # recent messages, oldest first
+        self._turn_tokens: list[int] = []
+        self.summarized_messages = 0
+        self.last_used = time.time()
+        self._summarizing = False
+        self._lock = threading.Lock()
+
+    def prompt_history(self) -> list[dict]:
+        """History to put in the prompt: the summary of older turns (if any), then the recent turns verbatim"""
+        with self._lock:
+            summary = [{"role": "summary", "content": self.summary}] if self.summary else []
+            return summary + list(self.turns)
+
+    def add_turn(self, user_message: str, answer: str):
+        with self._lock:
+            for message in ({"role": "user", "content": user_message}, {"role": "assistant", "content": answer}):
+                self.turns.append(message)
+                self._turn_tokens.append(count_tokens(message["content"]))
+
+    def begin_summary(self, recent_tokens: int = SESSION_RECENT_TOKENS) -> list[dict] | None:
+        """
+        Oldest turns to fold into the summary when the recent turns are over budget (None otherwise).
+        Enough turns are folded to bring the recent ones down to half the budget, so summaries are
+        not requested on every turn. They stay in the session until finish_summary replaces them.
+        """
+        with self._lock:
+            if self._summarizing or sum(self._turn_tokens) <= recent_tokens:
+                return None
+            remaining, count = sum(self._turn_tokens), 0
+            while count < len(self.turns) - 1 and remaining > recent_tokens // 2:
+                remaining -= self._turn_tokens[count]
+                count += 1
+            self._summarizing = True
+            return list(self.turns[:count])
+
+    def finish_summary(self, folded: int, summary: str | None):
+        """Replace the `folded` oldest turns by the new summary. On failure (None) they stay and are retried later."""
+        with self._lock:
+            self._summarizing = False
+            if summary is None:
+                return
+            self.summary = truncate_tokens(summary, SUMMARY_MAX_TOKENS)
+            del self.turns[:folded]
+            del self._turn_tokens[:folded]
+            self.summarized_messages += folded
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "session_id": self.session_id,
+                "doc_id": self.doc_id,
+                "summary": self.summary,
+                "summarized_messages": self.summarized_messages,
+                "recent_messages": len(self.turns),
+                "recent_tokens": sum(self._turn_tokens),
+            }
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl_seconds: float = SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: OrderedDict[str, ConversationSession] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, doc_id: str) -> ConversationSession:
+        session = ConversationSession(doc_id)
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._prune()
+        return session
+
+    def get(self, session_id: str) -> ConversationSession | None:
+        """The session, marked as used, or None if it does not exist or has expired."""
+        with self._lock:
+            self._prune()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.time()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _prune(self):
+        # Least recently used first: drop expired sessions, then any over the limit
+        cutoff = time.time() - self.ttl_seconds
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_used >= cutoff and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions}
@@ -0,0 +1,27 @@
+import tiktoken
+
+# --------------------- Token Counting ---------------------
+
+# One tokenizer for everything that is measured in tokens (token-window chunking, prompt budgets).
+# cl100k_base is the tokenizer of the OpenAI embedding and chat models.
+
+TOKENIZER_ENCODING = "cl100k_base"
+
+
+def get_encoding() -> tiktoken.Encoding:
+    # tiktoken caches encodings, only the first call loads the BPE ranks
+    return tiktoken.get_encoding(TOKENIZER_ENCODING)
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode_ordinary(text))
+
+
+def truncate_tokens(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    """First (or last, with keep_end) max_tokens tokens of text."""
+    tokens = get_encoding().encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    return get_encoding().decode(tokens[-max_tokens:] if keep_end else tokens[:max_tokens])
@@ -0,0 +1,132 @@
+import math
+import os
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import faiss  # imported on first use, loading it takes ~0.2s
+
+# --------------------- Vector Storage Modes ---------------------
+
+# How chunk vectors are stored, chosen per deployment with VECTOR_STORAGE_MODE:
+#   flat - exact float32 (4 bytes per dimension, 6 KB per 1536-dim chunk)
+#   fp16 - float16 scalar quantizer (2 bytes per dimension)
+#   sq8  - 8-bit scalar quantizer (1 byte per dimension)
+#   pq   - product quantization, PQ_SUBQUANTIZERS bytes per chunk plus a per-document codebook; documents
+#          too small for the codebook to pay off (see pq_nbytes) are stored as sq8
+# Run `python -m benchmarks.vector_storage` to compare memory, latency and recall of the modes.
+
+VECTOR_STORAGE_MODES = ("flat", "fp16", "sq8", "pq")
+VECTOR_STORAGE_MODE = os.getenv("VECTOR_STORAGE_MODE", "flat")
+if VECTOR_STORAGE_MODE not in VECTOR_STORAGE_MODES:
+    raise ValueError(f"VECTOR_STORAGE_MODE must be one of {VECTOR_STORAGE_MODES}, got {VECTOR_STORAGE_MODE!r}")
+PQ_SUBQUANTIZERS = int(os.getenv("PQ_SUBQUANTIZERS", "96"))
+
+# Product quantization needs at least 2**nbits training vectors per codebook; smaller documents use fewer bits
+_PQ_MIN_BITS = 4
+
+
+def create_index(vectors: np.ndarray, mode: str = VECTOR_STORAGE_MODE) -> "faiss.Index":
+    """Build an L2 index over vectors (n x d float32) using the given storage mode."""
+    import faiss
+
+    if mode not in VECTOR_STORAGE_MODES:
+        raise ValueError(f"Unknown vector storage mode {mode!r}, expected one of {VECTOR_STORAGE_MODES}")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dimension = vectors.shape
+
+    if mode == "pq":
+        nbits = min(8, int(math.log2(n))) if n > 0 else 0
+        if nbits < _PQ_MIN_BITS or dimension % PQ_SUBQUANTIZERS or pq_nbytes(n, dimension, nbits) >= n * dimension:
+            # Too few vectors to train codebooks, dimension not divisible, or the codebook outweighs what
+            # the codes save over 8-bit (below ~1100 chunks at 1536 dimensions): sq8 is smaller and needs no training
+            mode = "sq8"
+        else:
+            index = faiss.IndexPQ(dimension, PQ_SUBQUANTIZERS, nbits)
+            index.pq.cp.min_points_per_centroid = 1  # documents are smaller than faiss' recommended training set, don't warn
+
+    if mode == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif mode == "fp16":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16)
+    elif mode == "sq8":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit)
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def pq_nbytes(n: int, dimension: int, nbits: int, subquantizers: int = PQ_SUBQUANTIZERS) -> int:
+    """Size of a product quantizer over n vectors: the codes plus its float32 codebook of 2**nbits centroids per subquantizer"""
+    return n * math.ceil(subquantizers * nbits / 8) + 2 ** nbits * dimension * np.dtype(np.float32).itemsize
+
+
+def index_nbytes(index: "faiss.Index") -> int:
+    """Approximate memory held by an index: encoded vectors plus any codebook"""
+    import faiss
+
+    code_size = getattr(index, "code_size", index.d * np.dtype(np.float32).itemsize)
+    nbytes = index.ntotal * code_size
+    if isinstance(index, faiss.IndexPQ):
+        nbytes += index.pq.centroids.size() * np.dtype(np.float32).itemsize
+    return nbytes
+
+
+# --------------------- Page-window Search over one Document Index ---------------------
+
+# A document's chunk vectors are stored in a single FAISS index, page by page, so that the
+# chunks of page p occupy the contiguous id range [page_offsets[p], page_offsets[p + 1]).
+# Empty pages simply get an empty range, which keeps ids aligned with real page numbers.
+# A page window [first_page, last_page] is therefore one id range, searched in a single call.
+
+def build_page_offsets(page_chunks: list[list[str]]) -> np.ndarray:
+    """Offset table of length num_pages + 1: chunks of page p have ids offsets[p]..offsets[p + 1] - 1."""
+    return np.concatenate(([0], np.cumsum([len(chunks) for chunks in page_chunks]))).astype(np.int64)
+
+
+def search_page_window(
+    index: "faiss.Index",
+    page_offsets: np.ndarray,
+    query_embedding: list[float],
+    first_page: int,
+    last_page: int,
+    k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k nearest chunks whose page lies in [first_page, last_page] (0-based, clipped to the document).
+    Returns (distances, ids) sorted by distance, with ids being global chunk ids of the index.
+    """
+    import faiss
+
+    num_pages = len(page_offsets) - 1
+    first_page, last_page = max(first_page, 0), min(last_page, num_pages - 1)
+    if first_page > last_page:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+    lo, hi = int(page_offsets[first_page]), int(page_offsets[last_page + 1])
+    k = min(k, hi - lo)
+    if k <= 0:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+    query = np.asarray([query_embedding], dtype=np.float32)
+
+    if isinstance(index, (faiss.IndexFlat, faiss.IndexScalarQuantizer)):
+        params = faiss.SearchParameters(sel=faiss.IDSelectorRange(lo, hi))
+        distances, ids = index.search(query, k, params=params)
+        found = ids[0] >= 0  # FAISS pads with -1 when fewer than k results exist
+        return distances[0][found], ids[0][found]
+
+    # Indexes without search-time selectors (e.g. IndexPQ): decode the window's rows and rank them directly
+    window = index.reconstruct_n(lo, hi - lo)
+    window_distances = ((window - query) ** 2).sum(axis=1)
+    top = np.argsort(window_distances)[:k]
+    return window_distances[top].astype(np.float32), (top + lo).astype(np.int64)
+
+
+def ids_to_pages(page_offsets: np.ndarray, ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Map global chunk ids to (page number, chunk index within that page)."""
+    pages = np.searchsorted(page_offsets, ids, side="right") - 1
+    return pages, ids - page_offsets[pages]
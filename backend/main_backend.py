@@ -1,22 +1,66 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse, Response
 from pydantic import BaseModel
+from typing import Literal
 import uvicorn
-import fitz # PyMuPdf
-from dotenv import load_dotenv
-import docx2txt
 import os
-from agents.chunking import chunk_text_semantically
-from agents.embed import get_embeddings, embedding_model
-from agents.chatbot import get_llm_response
-import faiss
-from langchain.schema import Document
-from langchain_community.docstore.in_memory import InMemoryDocstore
-from langchain_community.vectorstores import FAISS
+from agents.chunking import CHUNKING_STRATEGY
+from agents.embed import get_embeddings, aget_query_embedding, embedding_cache, query_embedding_cache
+from agents.chatbot import aget_llm_response, astream_llm_response, asummarize_conversation, LLM_ERROR_MESSAGE
+from agents.answer_cache import AnswerCache
+from agents.lexical_index import BM25Index, reciprocal_rank_fusion
+from agents.ingest import chunk_and_embed_pages
+from agents.registry import DocumentRegistry
+from agents.vector_index import build_page_offsets, search_page_window, ids_to_pages, create_index, index_nbytes
+from agents.chunk_store import ChunkStore
+from agents.document_store import save_document, load_document, has_document, delete_document, save_source_file, source_file_path, prune_documents
+from agents.jobs import IngestionJob, JobManager
+from agents.sessions import ConversationSession, SessionStore
+from agents.incremental import IncrementalIngestion, IngestionTracker
+from agents.page_images import MAX_PAGE_IMAGE_WIDTH, PageImageCache
+from agents.extraction import extract_page_blocks
+from agents.boilerplate import NearDuplicateFilter, strip_boilerplate
+from agents.selection_index import SelectionIndex
+from agents.context_assembly import PROMPT_TOKEN_BUDGET, assemble_context, context_budget, trim_history
+from agents.metrics import SELECTION_QUERIES, RequestTimingMiddleware, StatsCollector, timed
+from agents.lazy import WARM_UP_ON_STARTUP, resource_stats, start_warm_up
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
 import numpy as np
+import asyncio
+import hashlib
+import json
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from uuid import uuid4
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # OpenAI, LangChain, FAISS and PyMuPDF are imported on first use (see agents/lazy.py), so the server
+    # starts answering (/health) right away; they are loaded in the background meanwhile
+    if WARM_UP_ON_STARTUP:
+        start_warm_up()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestTimingMiddleware)  # per-request timings, logged and exported at /metrics
+# The browser extension calls the backend from the page showing the PDF, so from any origin (no cookies are used)
+CORS_ALLOW_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ALLOW_ORIGINS", "*").split(",") if origin.strip()]
+app.add_middleware(CORSMiddleware, allow_origins=CORS_ALLOW_ORIGINS, allow_methods=["GET", "POST", "DELETE"], allow_headers=["*"])
+
+# dense: FAISS only, lexical: BM25 only (no query embedding), hybrid: both fused with reciprocal rank fusion
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Queries fall back to lexical retrieval when embedding them takes longer than this (or fails)
+QUERY_EMBEDDING_TIMEOUT = float(os.getenv("QUERY_EMBEDDING_TIMEOUT", "3"))
+# How long a query about a document still being ingested waits for its page window before answering 409
+INCREMENTAL_WAIT_SECONDS = float(os.getenv("INCREMENTAL_WAIT_SECONDS", "30"))
+if RETRIEVAL_MODE not in RETRIEVAL_MODES:
+    raise ValueError(f"RETRIEVAL_MODE must be one of {RETRIEVAL_MODES}, got {RETRIEVAL_MODE!r}")
 # ----------------------------------- CLASSES AND GLOBAL VARIABLES--------------------------------------
 
 # FastAPI does not maintain state between requests, 
@@ -24,128 +68,180 @@ app = FastAPI()
 
 class VectorDatabase:
     def __init__(self):
-        self.vector_store = None  # This will hold the FAISS index
-        self.embeddings = embedding_model
-
-    def create_vector_store(self, chunks: list[str], metadatas:list[dict]):
-        """Creates and stores the FAISS vector database"""
-        
-        # print(f"Inside create_vector_store: {len(chunks)} chunks", flush=True)
-        # print(chunks)
-        embeddings = get_embeddings(chunks)
-        dimension = len(embeddings[0])
-        
-        # print(len(embeddings), flush=True)
-        # Create FAISS index
-        faiss_index = faiss.IndexFlatL2(dimension)
-        faiss_index.add(np.array(embeddings, dtype=np.float32))
-
-        # Create a document store
-        documents_dict = {
-            str(i): Document(page_content=chunks[i], metadata=metadatas[i])
-            for i in range(len(chunks))
-        }
-        docstore = InMemoryDocstore(documents_dict)
-
-        index_to_docstore_id = {i: str(i) for i in range(len(chunks))}
-
-        # Store in global object
-        self.vector_store = FAISS(
-            index=faiss_index,
-            docstore=docstore,
-            index_to_docstore_id=index_to_docstore_id,
-            embedding_function=self.embeddings,
+        self.index = None  # FAISS index of the document's chunk vectors, ids are ChunkStore chunk ids
+        self.page_offsets = None  # chunks of page p have ids page_offsets[p]..page_offsets[p + 1] - 1
+
+    def create_index(self, chunks: list[str], embeddings: list[list[float]] | None = None):
+        """Builds the FAISS index of the chunks (chunks are embedded only if no embeddings are given)"""
+        if embeddings is None:
+            embeddings = get_embeddings(chunks)
+        # Create FAISS index (flat, float16, int8 or PQ depending on VECTOR_STORAGE_MODE)
+        self.index = create_index(np.array(embeddings, dtype=np.float32))
+
+    def search_pages(self, query_embedding: list[float], first_page: int, last_page: int, k: int) -> list[tuple[int, int, float]]:
+        """Top-k chunks within the page window [first_page, last_page] as (page, chunk index in page, distance)"""
+        if self.index is None:
+            return []
+        distances, ids = search_page_window(self.index, self.page_offsets, query_embedding, first_page, last_page, k)
+        pages, chunk_indices = ids_to_pages(self.page_offsets, ids)
+        return [(int(p), int(i), float(d)) for p, i, d in zip(pages, chunk_indices, distances)]
+
+    def memory_footprint(self) -> int:
+        """Approximate bytes held by the FAISS index vectors"""
+        if self.index is None:
+            return 0
+        return index_nbytes(self.index)
+
+class ParsedDocument:
+    """Everything retrieval needs for one uploaded document"""
+    def __init__(self, chunks: ChunkStore, vector_db: VectorDatabase, content_hash: str, indexes: dict | None = None):
+        self.chunks = chunks  # chunk texts of every page, in one buffer (see agents/chunk_store.py)
+        self.vector_db = vector_db  # one vector database holding the chunks of every page
+        self.content_hash = content_hash  # sha256 of the uploaded file, identifies re-uploads of the same PDF
+        # Both indexes are built from the chunks at ingestion, and read back from their stored arrays (indexes) on load
+        indexes = indexes or {}
+        if "lexical" in indexes:
+            self.lexical_index = BM25Index.from_arrays(chunks.page_offsets, indexes["lexical"])
+        else:
+            self.lexical_index = BM25Index(chunks.page_chunks())  # BM25 over the same chunks, needs no embeddings
+        if "selection" in indexes:
+            self.selection_index = SelectionIndex.from_arrays(chunks, indexes["selection"])
+        else:
+            self.selection_index = SelectionIndex(chunks)  # normalized chunk texts, locates highlighted passages
+
+    def index_arrays(self) -> dict:
+        """Arrays of the lexical and selection indexes, stored with the document"""
+        return {"lexical": self.lexical_index.to_arrays(), "selection": self.selection_index.to_arrays()}
+
+    def memory_footprint(self) -> int:
+        """Approximate bytes held by this document (chunk store + index vectors + lexical and selection indexes)"""
+        return (
+            self.chunks.nbytes() + self.vector_db.memory_footprint()
+            + self.lexical_index.memory_footprint() + self.selection_index.nbytes()
         )
 
-# Global vector database instance
-vector_db = VectorDatabase()
+# Global registry of parsed documents keyed by doc_id, evicts least-recently-queried documents over budget
+document_registry = DocumentRegistry()
+
+# Cached answers keyed by (content hash, page window, normalized query, chat history)
+answer_cache = AnswerCache()
+
+# Worker pool running uploads in the background (extract -> chunk & embed -> index -> persist)
+job_manager = JobManager()
+
+# Documents still being ingested, queries about pages already done are answered from them
+ingestion_tracker = IngestionTracker()
 
-# Initialize Global variables
-page_vector_dbs: list[VectorDatabase] = []  # This will hold the vector databases for each page
-page_chunks: list[list[str]] = []  # This will hold the chunks for each page where chunks is: list[str]
+# Rendered page images of stored PDFs
+page_image_cache = PageImageCache()
+
+# Stored PDFs never change (every upload gets a new doc_id), browsers may keep them
+DOCUMENT_FILE_CACHE_CONTROL = "private, max-age=86400, immutable"
+
+# Server-side conversations, so clients send only the new message instead of the whole history
+session_store = SessionStore()
+_summary_tasks: set[asyncio.Task] = set()  # keeps running summary tasks referenced until they finish
+
+# Cache hit/miss and registry counters, read from their stats() when /metrics is scraped
+REGISTRY.register(StatsCollector(embedding_cache, query_embedding_cache, answer_cache, document_registry))
 
 
 # ----------------------------------- CORE FUNCTIONS -----------------------------------
 
 # Extract text from PDF and return a list of strings, each representing a page's text.
-def extract_pdf_pages(file_bytes: bytes) -> list[str]:
+def extract_pdf_pages(file_bytes: bytes, on_progress=None, path: str | None = None) -> list[str]:
     """
     Extracts text from each page of a PDF and returns a list where each index corresponds to a page.
+    The PDF is parsed once; large documents are extracted by page ranges over a process pool.
+    Headers, footers and boilerplate repeated across pages are removed (see agents/boilerplate.py).
     
     :param file_bytes: The raw bytes of the PDF file
+    :param on_progress: Optional callback receiving pages_extracted, total_pages and boilerplate_blocks_removed counters
+    :param path: Optional file holding the same PDF, opened by the extraction workers instead of sending them the bytes
     :return: List of strings, each string is the text from one page
     """
-    pages_text = []
-
-    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-         return [page.get_text().strip() for page in doc]
-     
-# Extracts text from a PDF file and returns the full document text as a single string.
-def parse_file_contents(file_bytes: bytes) -> str:
-    """Returns full document text as a single string."""
-    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-        return "\n".join([page.get_text() for page in doc])
+    pages_blocks = extract_page_blocks(file_bytes, on_progress=on_progress, path=path)
+    page_texts, blocks_removed = strip_boilerplate(pages_blocks)
+    if on_progress is not None:
+        on_progress(boilerplate_blocks_removed=blocks_removed)
+    return page_texts
     
-# Chunks the text semantically using the SemanticChunker from LangChain for page wise data.
-def chunk_page_wise_texts(page_texts: list[str]) -> list[list[str]]:
-    """
-    For each page's text, create semantic chunks.
-    Returns a list where each element is a list of semantic chunks from that page.
-    """
-    return [chunk_text_semantically(page_text) for page_text in page_texts]
-
-# Chunks the full text of the document semantically and returns a flat list of all chunks.
-def chunk_full_text(full_text: str) -> list[str]:
-    """
-    Semantic chunking of the entire document as one block.
-    Returns a flat list of all semantic chunks.
-    """
-    return chunk_text_semantically(full_text)
-
-# Builds a vector store for each page's chunks and returns a list of vector stores.
-# Assume VectorDatabase and vector_db = VectorDatabase() are already defined elsewhere
-
-def build_page_vector_stores(page_chunks: list[list[str]]) -> list[VectorDatabase]:
+# Builds one vector store holding the chunks of every page, stored page by page.
+def build_document_vector_store(page_chunks: list[list[str]], page_embeddings: list[list[list[float]]] | None = None) -> VectorDatabase:
     """
-    Creates a list of vector databases, one for each page's chunks.
+    Creates a single vector database for the whole document with a page offset table,
+    so a page window can be searched in one call.
     Args:
         page_chunks (List[List[str]]): List of pages, each containing a list of chunked strings.
+        page_embeddings (List[List[List[float]]], optional): Precomputed embeddings aligned with page_chunks.
+            When omitted, all chunks of the document are embedded here in one batched call.
     Returns:
-        List[VectorDatabase]: List of FAISS vector store objects for each page.
+        VectorDatabase: FAISS index for the document (empty pages own no ids but keep their page number).
     """
-    page_vector_dbs = []
-
-    for page_num, chunks in enumerate(page_chunks):
-        if not chunks:
-            continue  # Skip empty pages
-        
-        # Create a new vector database instance for this page
-        vector_db = VectorDatabase()
-
-        # Generate simple metadata for each chunk
-        metadatas = [{"page": page_num, "chunk_id": str(uuid4())} for _ in chunks]
-
-        # Create the vector store for this page
-        vector_db.create_vector_store(chunks, metadatas)
-
-        # Append the vector store to the list
-        page_vector_dbs.append(vector_db)
-
-    return page_vector_dbs
-
-# Retrieves the context for a given query from the vector database.
-def get_context(query: str, page_number: int, top_k: int) -> str:
-    """Retrieve top-k relevant chunks from previous, current, and next page vector DBs."""
-    # Collect relevant page indices
-    page_indices = [page_number - 1, page_number, page_number + 1]
-    # print(page_indices, len(page_vector_dbs))
-    
-    # Boundary check to avoid index errors
-    page_indices = [i for i in page_indices if 0 <= i < len(page_vector_dbs)]
-    # print(page_indices)
-    
-    query_embedding = get_embeddings([query])[0]
-    context_chunks = []
+    vector_db = VectorDatabase()
+    vector_db.page_offsets = build_page_offsets(page_chunks)
+
+    chunks = [chunk for page in page_chunks for chunk in page]
+    if not chunks:
+        return vector_db  # Nothing to index (e.g. a scanned PDF without text)
+
+    embeddings = None
+    if page_embeddings is not None:
+        embeddings = [vector for page in page_embeddings for vector in page]
+
+    vector_db.create_index(chunks, embeddings)
+    return vector_db
+
+# Rebuilds a persisted document without re-embedding anything.
+def load_parsed_document(doc_id: str) -> "ParsedDocument | None":
+    """Loads a document from the persistent store (index is memory-mapped), or None if it was never stored."""
+    stored = load_document(doc_id)
+    if stored is None:
+        return None
+    chunks, faiss_index, meta, indexes = stored
+
+    vector_db = VectorDatabase()
+    vector_db.page_offsets = chunks.page_offsets
+    vector_db.index = faiss_index
+
+    print(f"[INFO] Loaded document {doc_id} from the document store")
+    return ParsedDocument(chunks, vector_db, content_hash=meta.get("content_hash") or doc_id, indexes=indexes)
+
+# Looks a document up in memory first, then lazily in the persistent store.
+def get_document(doc_id: str) -> "ParsedDocument | None":
+    document = document_registry.get(doc_id)
+    if document is None:
+        try:
+            document = load_parsed_document(doc_id)
+        except ValueError:
+            return None  # malformed doc_id
+        if document is not None:
+            document_registry.add(document, document.memory_footprint(), doc_id=doc_id)
+    return document
+
+# Pages searched for a question asked on a given (1-based) page: the previous, current and next page (0-based).
+def page_window(page_number: int) -> tuple[int, int]:
+    page_index = page_number - 1
+    return page_index - 1, page_index + 1
+
+# Builds the context for a query from the vector database and/or the lexical index.
+def build_context(
+    document: ParsedDocument,
+    query: str,
+    query_embedding: list[float] | None,
+    page_number: int,
+    top_k: int,
+    mode: str = RETRIEVAL_MODE,
+    token_budget: int = PROMPT_TOKEN_BUDGET,
+) -> str:
+    """
+    Retrieve the most relevant chunks from the previous, current, and next page of a document.
+    page_number is 1-based (as shown to the user); up to top_k chunks per page in the window are
+    retrieved, ranked together across the window, and the best non-redundant ones fitting in
+    token_budget tokens make up the context. Without a query embedding, retrieval is lexical only.
+    """
+    first_page, last_page = page_window(page_number)
+    k = top_k * 3
     
     # Testing print statements
     # print("====== Page-wise Chunks (Preview) ======\n")
@@ -155,21 +251,35 @@ def get_context(query: str, page_number: int, top_k: int) -> str:
     #         print(f"  Chunk {j + 1}: {(chunk)}...\n")
     #     # print("-" * 50)
 
-    for idx in page_indices:
-        vector_db = page_vector_dbs[idx]
-        chunks = page_chunks[idx]
-
-        if vector_db.vector_store is None:
-            continue  # Skip if vector store not initialized
-
-        distances, indices = vector_db.vector_store.index.search(
-            np.array([query_embedding], dtype=np.float32), k=top_k
-        )
-
-        retrieved = [chunks[i] for i in indices[0] if i < len(chunks)]
-        context_chunks.extend(retrieved)
+    with timed("retrieval"):
+        if query_embedding is None or mode == "lexical":
+            keys = [(page, chunk_idx) for page, chunk_idx, _ in document.lexical_index.search_pages(query, first_page, last_page, k)]
+        elif mode == "dense":
+            keys = [(page, chunk_idx) for page, chunk_idx, _ in document.vector_db.search_pages(query_embedding, first_page, last_page, k)]
+        else:
+            dense = [(page, chunk_idx) for page, chunk_idx, _ in document.vector_db.search_pages(query_embedding, first_page, last_page, k)]
+            lexical = [(page, chunk_idx) for page, chunk_idx, _ in document.lexical_index.search_pages(query, first_page, last_page, k)]
+            keys = reciprocal_rank_fusion([dense, lexical], k)
+        context = assemble_context([document.chunks.get(page, chunk_idx) for page, chunk_idx in keys], token_budget)
+
+    return context
+
+# Embeds a query for the API, or returns None when retrieval should go lexical-only
+async def embed_query_or_none(query: str, mode: str) -> list[float] | None:
+    """The query embedding, or None in lexical mode or when the embedding service is slow or failing."""
+    if mode == "lexical":
+        return None
+    try:
+        with timed("query_embedding"):
+            return await asyncio.wait_for(aget_query_embedding(query), timeout=QUERY_EMBEDDING_TIMEOUT)
+    except Exception as e:
+        print(f"[WARN] Query embedding unavailable ({type(e).__name__}: {e}), falling back to lexical retrieval")
+        return None
 
-    return "\n\n".join(context_chunks)
+# Builds the context of a highlighted passage from the chunks holding it and their neighbors, nothing is searched.
+def build_selection_context(document: ParsedDocument, first_chunk: int, last_chunk: int, token_budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    chunk_ids = document.selection_index.context_chunk_ids(first_chunk, last_chunk)
+    return assemble_context([document.chunks.text(chunk_id) for chunk_id in chunk_ids], token_budget)
 
 
 # ------------------------------- DATA MODELS FOR ENDPOINTS-------------------------------
@@ -177,57 +287,424 @@ class pdfParserRequest(BaseModel):
     file: UploadFile = File(...)
 
 class QueryResponseRequest(BaseModel):
+    doc_id: str # returned by /parse_pdf
     query: str
-    page_num: int # include a less than operator to avoid out of bounds error
-    chat_history: list[dict] # List of dictionaries with 'role' and 'content'
+    page_num: int # 1-based page number, pages outside the document are clipped away during retrieval
+    retrieval_mode: Literal["dense", "lexical", "hybrid"] | None = None # defaults to RETRIEVAL_MODE
+    session_id: str | None = None # returned by /sessions, the history is then kept by the server
+    chat_history: list[dict] = [] # List of dictionaries with 'role' and 'content', only used without a session_id
+
+class SessionRequest(BaseModel):
+    doc_id: str
+
+class PdfContext(BaseModel):
+    doc_id: str | None = None
+    page_num: int | None = None
+    selection: str | None = None
+
+class ExtensionQueryRequest(BaseModel):
+    query: str
+    doc_id: str | None = None # returned by /parse_pdf, here or in pdfContext
+    page_num: int | None = None # 1-based page the user is looking at, here or in pdfContext
+    selection: str | None = None # text highlighted by the user, here or in pdfContext
+    pdfContext: PdfContext | None = None # viewer state, as sent by the browser extension
+    retrieval_mode: Literal["dense", "lexical", "hybrid"] | None = None # only used when the selection is not found
+    session_id: str | None = None
+    chat_history: list[dict] = []
     
 # ------------------------------- FAST API ENDPOINTS -------------------------------
-@app.post("/parse_pdf")
-async def parse_pdf(file: UploadFile = File(...)):
-    global page_chunks, page_vector_dbs
+# Runs on the ingestion worker pool, reporting stage and progress through the job.
+def ingest_document(job: IngestionJob, contents: bytes, chunking_strategy: str = CHUNKING_STRATEGY, focus_page: int = 1):
+    """Extracts, chunks, embeds, indexes and persists an uploaded PDF under job.doc_id, focus_page (1-based) first."""
+    try:
+        _ingest_document(job, contents, chunking_strategy, focus_page)
+    except Exception:
+        # Nothing was stored but the upload, which /documents/{doc_id}/file would keep serving
+        if not has_document(job.doc_id):
+            delete_document(job.doc_id)
+        raise
+
+def _ingest_document(job: IngestionJob, contents: bytes, chunking_strategy: str, focus_page: int):
+    job.set_stage("extract")
+    # The upload was stored as source.pdf before the job was queued, extraction workers read it from there
+    page_wise_texts = extract_pdf_pages(contents, on_progress=job.update, path=source_file_path(job.doc_id))
+    content_hash = hashlib.sha256(contents).hexdigest()
+
+    print(f"[INFO] Parsed {len(page_wise_texts)} pages")
+    print(f"[INFO] Text length: {sum(len(text) for text in page_wise_texts)} characters")
     
+    # Create chunks of page wise text
+    # With semantic chunking, chunk vectors are derived from the embeddings the chunker computes, so chunking and embedding run together
+    # Pages go in priority order (focus window first, re-prioritized by queries), each batch is queryable once done
+    ingestion = IncrementalIngestion(job.doc_id, len(page_wise_texts), content_hash, focus_page=focus_page - 1)
+    ingestion_tracker.start(ingestion)
+    try:
+        job.set_stage("chunk_and_embed")
+        chunks_embedded = 0
+        duplicates = NearDuplicateFilter()  # shared by all batches, duplicates are detected across the whole document
+        while batch := ingestion.next_batch():
+            batch_chunks, batch_embeddings = chunk_and_embed_pages(
+                [page_wise_texts[page] for page in batch], strategy=chunking_strategy, duplicates=duplicates, page_numbers=batch,
+            )
+            ingestion.add_pages(batch, batch_chunks, batch_embeddings)
+            chunks_embedded += sum(len(chunks) for chunks in batch_chunks)
+            job.update(pages_chunked=ingestion.pages_done(), chunks_embedded=chunks_embedded, duplicate_chunks_removed=duplicates.duplicates)
+        page_chunks, page_embeddings = ingestion.result()  # List[List[str]] its a list of chunks for each page
+        chunks = ChunkStore.from_page_chunks(page_chunks)
+        print(
+            f"[INFO] Boilerplate removed: {job.progress.get('boilerplate_blocks_removed', 0)} blocks, "
+            f"{duplicates.duplicates} near-duplicate chunks dropped"
+        )
+        
+        # store the page embeddings in one vectorDB for the whole document
+        job.set_stage("index")
+        vector_db = build_document_vector_store(page_chunks, page_embeddings)
+        print(f"Vector store created: {sum(len(chunks) for chunks in page_chunks)} chunks over {len(page_chunks)} pages")
+        document = ParsedDocument(chunks, vector_db, content_hash)  # also builds the lexical and selection indexes
+        
+        # Persist chunks and indexes so the document survives restarts without re-embedding or re-indexing
+        job.set_stage("persist")
+        save_document(job.doc_id, chunks, vector_db.index, meta={
+            "content_hash": content_hash,
+            "chunking_strategy": chunking_strategy,
+            "boilerplate_blocks_removed": job.progress.get("boilerplate_blocks_removed", 0),
+            "duplicate_chunks_removed": duplicates.duplicates,
+        }, indexes=document.index_arrays())
+        
+        document_registry.add(document, document.memory_footprint(), doc_id=job.doc_id)
+    finally:
+        ingestion_tracker.finish(job.doc_id)
+
+@app.post("/parse_pdf")
+async def parse_pdf(
+    file: UploadFile = File(...),
+    chunking_strategy: Literal["semantic", "token"] | None = Form(None), # defaults to CHUNKING_STRATEGY
+    focus_page: int = Form(1), # 1-based page the user is viewing, ingested (and queryable) first
+):
     contents = await file.read()
+    doc_id = uuid4().hex
     
-    try:
-        page_wise_texts = extract_pdf_pages(contents)
-        full_text = parse_file_contents(contents)
+    # Make room first: documents unused for long, then least recently used ones over the store's size limit
+    await run_in_threadpool(prune_documents, in_use=document_in_use)
 
-        # Store or process here (e.g., save to disk/db, start chunking etc.)
-        # For now we just keep them as variables (example):
-        print(f"[INFO] Parsed {len(page_wise_texts)} pages")
-        print(f"[INFO] Full text length: {len(full_text)} characters")
+    # Stored first, so viewers can load the PDF from /documents/{doc_id}/file while it is ingested
+    await run_in_threadpool(save_source_file, doc_id, contents)
+    
+    # Ingestion runs in the background, poll /jobs/{job_id} until its status is "done"
+    # (queries about pages already ingested are answered before that)
+    job = job_manager.submit(
+        IngestionJob(doc_id=doc_id, filename=file.filename),
+        ingest_document, contents, chunking_strategy or CHUNKING_STRATEGY, focus_page,
+    )
+    
+    return {"job_id": job.job_id, "doc_id": job.doc_id, "status": job.status}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
+
+# Document view of the pages of a window that are already ingested (all other pages empty)
+def build_window_document(ingestion: IncrementalIngestion, page_number: int) -> ParsedDocument:
+    page_chunks, page_embeddings = ingestion.window(*page_window(page_number))
+    return ParsedDocument(
+        ChunkStore.from_page_chunks(page_chunks), build_document_vector_store(page_chunks, page_embeddings), ingestion.content_hash,
+    )
 
-    except Exception as e:
-        return {"error": str(e)}
+def ingestion_in_progress(doc_id: str) -> bool:
+    job = job_manager.job_for_document(doc_id)
+    return job is not None and job.status in ("queued", "running")
+
+# Documents loaded in memory or still being ingested are never pruned from the document store
+def document_in_use(doc_id: str) -> bool:
+    return doc_id in document_registry or ingestion_in_progress(doc_id)
+
+# Waits until the page window of an ongoing ingestion is done, moving it to the front of the pages left.
+# Returns None on timeout, or if the ingestion ends (completes or fails) first.
+async def wait_for_window(doc_id: str, page_number: int) -> IncrementalIngestion | None:
+    first_page, last_page = page_window(page_number)
+    deadline = time.monotonic() + INCREMENTAL_WAIT_SECONDS
+    while ingestion_in_progress(doc_id) and time.monotonic() < deadline:
+        # Not tracked yet while the job is queued or extracting text
+        ingestion = ingestion_tracker.get(doc_id)
+        if ingestion is not None:
+            ingestion.prioritize(first_page, last_page)
+            if ingestion.window_ready(first_page, last_page):
+                return ingestion
+        await asyncio.sleep(0.05)
+    return None
+
+# Looks up the document of a query request, raising the HTTP error the client should see.
+# While the document is being ingested, a query about page_number is answered from its page window once ready.
+async def require_document(doc_id: str, page_number: int | None = None) -> ParsedDocument:
+    # A document evicted from memory may be read back from disk, keep that off the event loop
+    document = await run_in_threadpool(get_document, doc_id)
+    if document is None and page_number is not None and ingestion_in_progress(doc_id):
+        ingestion = await wait_for_window(doc_id, page_number)
+        if ingestion is not None:
+            return build_window_document(ingestion, page_number)
+        # The ingestion may have completed while waiting
+        document = await run_in_threadpool(get_document, doc_id)
+    if document is None:
+        if ingestion_in_progress(doc_id):
+            raise HTTPException(status_code=409, detail="Document is still being processed.")
+        raise HTTPException(status_code=404, detail="Document not found. It may have expired, please upload it again.")
+    return document
+
+# Looks up the session of a query request (None for stateless requests that send their own history).
+def require_session(request: QueryResponseRequest) -> ConversationSession | None:
+    if request.session_id is None:
+        return None
+    session = session_store.get(request.session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found. It may have expired, please start a new one.")
+    if session.doc_id != request.doc_id:
+        raise HTTPException(status_code=400, detail="Session belongs to another document.")
+    return session
+
+# Stores a finished turn in its session and, when the recent turns are over budget, folds the oldest
+# ones into the rolling summary in the background (the answer is not held back by the summary call).
+def record_turn(session: ConversationSession | None, query: str, answer: str):
+    if session is None or answer == LLM_ERROR_MESSAGE:
+        return
+    session.add_turn(query, answer)
+    folded = session.begin_summary()
+    if folded:
+        task = asyncio.create_task(summarize_session(session, folded))
+        _summary_tasks.add(task)
+        task.add_done_callback(_summary_tasks.discard)
+
+async def summarize_session(session: ConversationSession, folded: list[dict]):
+    summary = await asummarize_conversation(session.summary, folded)
+    session.finish_summary(len(folded), summary)
+
+# Answers repeated questions from the answer cache, embedding the query only when there is no exact hit.
+async def lookup_cached_answer(document: ParsedDocument, request: QueryResponseRequest, chat_history: list[dict]) -> tuple[tuple, list[float] | None, str | None]:
+    """
+    Returns (cache key, query embedding or None, cached answer or None). The key is None when the
+    answer must not be cached: the query could not be embedded, so retrieval degraded to lexical.
+    """
+    mode = request.retrieval_mode or RETRIEVAL_MODE
+    cache_key = AnswerCache.make_key(document.content_hash, page_window(request.page_num), request.query, chat_history, mode)
+    answer = answer_cache.get(cache_key)
+    if answer is not None:
+        return cache_key, None, answer
     
-    # Create chunks of page wise text and ful text
-    page_chunks = chunk_page_wise_texts(page_wise_texts)  # List[List[str]] its a list of chunks for each page
-    full_chunks = chunk_full_text(full_text)              # List[str] its a list of chunks of the entire text
+    query_embedding = await embed_query_or_none(request.query, mode)
+    if query_embedding is None:
+        answer_cache.record_miss()
+        return (cache_key if mode == "lexical" else None), None, None
+    return cache_key, query_embedding, answer_cache.get_similar(cache_key, query_embedding)
+
+# Answers a query from the context retrieved around its page, through the answer cache.
+async def answer_from_page_window(document: ParsedDocument, request: QueryResponseRequest, full_history: list[dict]) -> str:
+    top_k = 3  # Number of top relevant chunks to retrieve per page in the window
     
-    # convert page_chunks to a list of embeddings for each page and store in a vectorDB
-    page_vector_dbs = build_page_vector_stores(page_chunks)
-    print(f"Vector stores created: {len(page_vector_dbs)}")
+    cache_key, query_embedding, answer = await lookup_cached_answer(document, request, full_history)
+    if answer is not None:
+        return answer
     
-    return "Parsed and chunked successfully."
+    # History and context share the prompt token budget, older turns are dropped first
+    chat_history, history_tokens = trim_history(full_history)
+    context = build_context(
+        document, request.query, query_embedding, request.page_num, top_k,
+        request.retrieval_mode or RETRIEVAL_MODE, context_budget(request.query, history_tokens),
+    )
+    answer = await aget_llm_response(
+        user_query=request.query, 
+        context=context, 
+        chat_history=chat_history
+    )
+    if cache_key is not None and answer != LLM_ERROR_MESSAGE:
+        answer_cache.put(cache_key, answer, query_embedding)
+    return answer
 
 @app.post("/query_response")
 async def query_response(request: QueryResponseRequest):
-    top_k = 3  # Number of top relevant chunks to retrieve
+    session = require_session(request)
+    document = await require_document(request.doc_id, request.page_num)
+    full_history = session.prompt_history() if session is not None else request.chat_history
     
-    # if request.page_num < 1 or request.page_num > len(page_vector_dbs):
-    #     return {"error": "Page number out of bounds."}
-    print(request.page_num)
+    answer = await answer_from_page_window(document, request, full_history)
+    record_turn(session, request.query, answer)
+    return answer
+
+@app.post("/query_response/stream")
+async def query_response_stream(request: QueryResponseRequest):
+    """
+    Same as /query_response but streams the answer as Server-Sent Events while the model generates it.
+    Each event is `data: {"delta": "..."}`, the last one is `data: {"done": true}`.
+    """
+    top_k = 3  # Number of top relevant chunks to retrieve per page in the window
     
-    context = get_context(request.query, request.page_num, top_k)
-    print(f"Context retrieved for page {request.page_num}: {context[:100]}...")  # Print first 100 chars for brevity
-    return get_llm_response(
-        user_query=request.query, 
-        context=context, 
-        chat_history=request.chat_history
+    session = require_session(request)
+    document = await require_document(request.doc_id, request.page_num)
+    full_history = session.prompt_history() if session is not None else request.chat_history
+    cache_key, query_embedding, cached_answer = await lookup_cached_answer(document, request, full_history)
+    
+    async def events():
+        if cached_answer is not None:
+            record_turn(session, request.query, cached_answer)
+            yield f"data: {json.dumps({'delta': cached_answer})}\n\n"
+            yield f"data: {json.dumps({'done': True})}\n\n"
+            return
+        
+        chat_history, history_tokens = trim_history(full_history)
+        context = build_context(
+            document, request.query, query_embedding, request.page_num, top_k,
+            request.retrieval_mode or RETRIEVAL_MODE, context_budget(request.query, history_tokens),
+        )
+        deltas = []
+        async for delta in astream_llm_response(
+            user_query=request.query,
+            context=context,
+            chat_history=chat_history
+        ):
+            deltas.append(delta)
+            yield f"data: {json.dumps({'delta': delta})}\n\n"
+        if LLM_ERROR_MESSAGE not in deltas:
+            if cache_key is not None:
+                answer_cache.put(cache_key, "".join(deltas), query_embedding)
+            record_turn(session, request.query, "".join(deltas))
+        yield f"data: {json.dumps({'done': True})}\n\n"
+    
+    # X-Accel-Buffering stops reverse proxies from holding back the stream
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    
+@app.post("/api/query")
+async def extension_query(request: ExtensionQueryRequest):
+    """
+    Highlight-and-ask from the browser extension (extension/background.js, extension/content.js).
+    The selected text is located in the document's chunks (see agents/selection_index.py), and the
+    chunks holding it and their neighbors are the context: no query embedding, no search. Without a
+    selection, or when it is not found, the query is answered like /query_response around page_num.
+    Returns content (the answer), timestamp, source ("selection" or "retrieval") and the 1-based pages used.
+    """
+    pdf_context = request.pdfContext or PdfContext()
+    doc_id = request.doc_id or pdf_context.doc_id
+    page_num = request.page_num or pdf_context.page_num
+    selection = (request.selection or pdf_context.selection or "").strip()
+    if doc_id is None:
+        raise HTTPException(status_code=400, detail="doc_id is required.")
+    
+    # The model sees the question together with the passage it is about
+    query = f'{request.query}\n\nHighlighted passage:\n"{selection}"' if selection else request.query
+    query_request = QueryResponseRequest(
+        doc_id=doc_id, query=query, page_num=page_num or 1, retrieval_mode=request.retrieval_mode,
+        session_id=request.session_id, chat_history=request.chat_history,
     )
+    session = require_session(query_request)
+    document = await require_document(doc_id, page_num)
+    full_history = session.prompt_history() if session is not None else request.chat_history
+    
+    match = None
+    if selection:
+        with timed("selection_match"):
+            match = document.selection_index.find(selection, page_num - 1 if page_num else None)
+    
+    if match is not None:
+        source = "selection"
+        first_chunk, last_chunk = match
+        pages = sorted({int(document.chunks.chunk_pages[chunk_id]) + 1 for chunk_id in range(first_chunk, last_chunk + 1)})
+        cache_key = AnswerCache.make_key(document.content_hash, match, query, full_history, "selection")
+        answer = answer_cache.get(cache_key)
+        if answer is None:
+            answer_cache.record_miss()
+            chat_history, history_tokens = trim_history(full_history)
+            with timed("retrieval"):
+                context = build_selection_context(document, first_chunk, last_chunk, context_budget(query, history_tokens))
+            answer = await aget_llm_response(user_query=query, context=context, chat_history=chat_history)
+            if answer != LLM_ERROR_MESSAGE:
+                answer_cache.put(cache_key, answer)
+    else:
+        if page_num is None:
+            raise HTTPException(status_code=400, detail="page_num is required when the selection is missing or not found in the document.")
+        source = "retrieval"
+        first_page, last_page = page_window(page_num)
+        pages = list(range(max(first_page, 0) + 1, min(last_page, document.chunks.num_pages - 1) + 2))
+        answer = await answer_from_page_window(document, query_request, full_history)
+    
+    SELECTION_QUERIES.labels(source).inc()
+    record_turn(session, query, answer)
+    return {
+        "content": answer,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "doc_id": doc_id,
+        "source": source,
+        "pages": pages,
+    }
+
+@app.post("/sessions")
+async def create_session(request: SessionRequest):
+    # A conversation about one document, pass its session_id with every query (allowed while it is being ingested)
+    if not ingestion_in_progress(request.doc_id):
+        await require_document(request.doc_id)
+    return session_store.create(request.doc_id).to_dict()
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return session.to_dict()
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return {"deleted": session_id}
+
+@app.get("/embedding_cache/stats")
+async def embedding_cache_stats():
+    # Hit/miss counters of the embedding cache shared by chunking and retrieval
+    return embedding_cache.stats()
+
+@app.get("/answer_cache/stats")
+async def answer_cache_stats():
+    # Hit rates of the answer cache and of the in-memory query embedding cache
+    return {"answers": answer_cache.stats(), "query_embeddings": query_embedding_cache.stats()}
+
+@app.get("/documents/stats")
+async def document_registry_stats():
+    # Number of documents held by this process and their memory footprint against the budget
+    return document_registry.stats()
+
+@app.get("/documents/{doc_id}/file")
+async def get_document_file(doc_id: str):
+    # The uploaded PDF. FileResponse answers Range requests (206 Partial Content), so PDF viewers
+    # fetch only the parts they display
+    path = source_file_path(doc_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Document file not found.")
+    return FileResponse(path, media_type="application/pdf", headers={"Cache-Control": DOCUMENT_FILE_CACHE_CONTROL})
+
+@app.get("/documents/{doc_id}/pages/{page_number}.png")
+async def get_page_image(doc_id: str, page_number: int, width: int = Query(800, ge=16, le=MAX_PAGE_IMAGE_WIDTH)):
+    # One page (1-based) rendered on demand at the given width, e.g. width=160 for thumbnails
+    path = source_file_path(doc_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Document file not found.")
+    try:
+        image = await run_in_threadpool(page_image_cache.get_or_render, path, page_number - 1, width)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Response(image, media_type="image/png", headers={"Cache-Control": DOCUMENT_FILE_CACHE_CONTROL})
+
+@app.get("/")
+@app.get("/health")
+async def health():
+    # Answered without touching any heavy module, ready tells whether they have all been loaded yet
+    return {"status": "ok", **resource_stats()}
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus exposition: stage/request latency histograms, API call and token counters, cache counters
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
     
 # ---------------------------- TESTING ENTRY POINT FOR TERMINAL ----------------------------
-def preview_chunks(page_chunks: list[list[str]], full_chunks: list[str], page_limit: int = 2, chunk_limit: int = 3):
+def preview_chunks(page_chunks: list[list[str]], page_limit: int = 2, chunk_limit: int = 3):
     print("====== Page-wise Chunks (Preview) ======\n")
     for i, chunks in enumerate(page_chunks[:page_limit]):
         print(f"Page {i + 1}:")
@@ -235,82 +712,11 @@ def preview_chunks(page_chunks: list[list[str]], full_chunks: list[str], page_li
             print(f"  Chunk {j + 1}: {(chunk)}...\n")
         print("-" * 50)
 
-    print("\n====== Full Document Chunks (Preview) ======\n")
-    for i, chunk in enumerate(full_chunks[:chunk_limit]):
-        print(f"Chunk {i + 1}: {(chunk)}...\n")
-    print("-" * 50)
-
-# MAIN FUNCTION TO RUN THE BACKEND TESTING
-# import tkinter as tk
-# from tkinter import filedialog
-
-# def main():
-#     global page_chunks, page_vector_dbs
-    
-#     # Hide the main tkinter window
-#     root = tk.Tk()
-#     root.withdraw()
-
-#     # Open the file dialog to select PDF or DOCX
-#     file_path = filedialog.askopenfilename(
-#         title="Select a PDF or DOCX file",
-#         filetypes=[("PDF files", "*.pdf"), ("Word Documents", "*.docx *.doc")]
-#     )
-
-#     if not file_path:
-#         print("No file selected.")
-#         return
-
-#     file_name = os.path.basename(file_path)
-#     with open(file_path, "rb") as f:
-#         file_bytes = f.read()
-        
-#     page_wise_parsed = extract_pdf_pages(file_bytes)
-#     # for i, page in enumerate(page_wise_parsed):
-#     #     print(f"\n--- Page {i+1} ---\n{page}")
-
-#     try:
-#         complete_parsed_text = parse_file_contents(file_bytes)
-#         # print("\n--- Extracted Text Start ---\n")
-#         # print(complete_parsed_text)
-#         # print("\n--- Extracted Text End ---")
-#     except ValueError as e:
-#         print(f"Error: {e}")
-    
-#     page_chunks = chunk_page_wise_texts(page_wise_parsed)  # List[List[str]] its a list of chunks for each page
-#     full_chunks = chunk_full_text(complete_parsed_text)    # List[str] its a list of chunks of the entire text
-    
-#     # Call this after generating your chunks
-#     # preview_chunks(page_chunks, full_chunks)
-    
-#     # convert page_chunks to a list of embeddings for each page and store in a vectorDB
-#     page_vector_dbs = build_page_vector_stores(page_chunks)
-#     print(f"Vector stores created: {len(page_vector_dbs)}")
-    
-#     for i, db in enumerate(page_vector_dbs):
-#         print(f"DB {i} type: {type(db)}")
-        
-#     context = get_context("Zero-Shot Multi-Task Rearrangement", page_number=4, top_k=2)
-#     print(f"Context retrieved: {context}")
-    
-#     result = get_llm_response(
-#         user_query="""Explain during NeRF training, this encourages the space around the
-#  object to be represented as empty, which will later allow
-#  us to freely move this object around the scene and render
-#  it from novel poses. Since we move the entire foreground
-#  NeRF, this empty space supervision is important to allow the
-#  two NeRFs to be rendered together correctly.
-#  Give me a detailed explanation of this paragraph and the words used in it.""",
-#         context=context, 
-#         chat_history=[]
-#     )
-    
-#     print(f"\n\n\nLLM Response: {result}")
+# End-to-end ingestion and query measurements live in benchmarks/ (python -m benchmarks.end_to_end)
 
 # ---------------------------- RUN MODE ----------------------------
 
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000, reload=True)
     # Run using : "uvicorn backend.main_backend:app --host 127.0.0.1 --port 8000 --reload"
-    # main()
     # conda activate "D:\Projects\AI Apps\Agents\AskMyDoc\askmydoc_venv"
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+Compares the chunking strategies of agents.chunking (semantic, token) on a sample corpus.
+
+Throughput: every page is chunked and all chunks get a vector, as at ingestion, with embeddings
+served by the local OpenAI stub at --embedding-latency-ms per request (so the semantic chunker's
+per-page embedding calls cost what network round trips would). Reported as pages/sec and
+embedding requests.
+
+Retrieval quality: chunks are embedded with the CPU-local hashing provider and each query is a
+sentence of the corpus with its words shuffled and some dropped. hit@k is the fraction of queries
+where one of the k nearest chunks of the whole document contains the source sentence.
+
+    python -m benchmarks.chunking --pages 50 --embedding-latency-ms 50
+    python -m benchmarks.chunking --pdf paper.pdf --queries 300
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import httpx
+import numpy as np
+
+from agents.chunking import CHUNK_TOKENS, CHUNKING_STRATEGIES, chunk_text_by_tokens, split_sentences
+from agents.semantic_chunker import CachedEmbeddings, EmbeddingSemanticChunker
+from agents.embed_cache import EmbeddingCache
+from agents.embedding_providers import EmbeddingProvider, HashingEmbeddingProvider, OpenAIEmbeddingProvider
+from agents.extraction import extract_pages
+from agents.vector_index import create_index, search_page_window
+from benchmarks.stub_openai import StubOpenAIServer
+from benchmarks.synthetic_pdf import make_synthetic_pdf
+
+
+def chunk_and_embed(pages: list[str], strategy: str, provider: EmbeddingProvider, chunk_tokens: int) -> tuple[list[str], np.ndarray]:
+    """All chunks of the corpus and their vectors. A memory-only cache per run, so no run benefits from another."""
+    embeddings = CachedEmbeddings(provider, EmbeddingCache(cache_dir=None))
+    chunks, vectors = [], []
+    if strategy == "semantic":
+        chunker = EmbeddingSemanticChunker(embeddings)
+        for page in pages:
+            page_chunks, page_vectors = chunker.split_text_with_embeddings(page) if page.strip() else ([], [])
+            chunks += page_chunks
+            vectors += page_vectors
+    else:
+        for page in pages:
+            page_chunks = chunk_text_by_tokens(page, chunk_tokens) if page.strip() else []
+            chunks += page_chunks
+            vectors += [None] * len(page_chunks)
+
+    # Chunks without a vector from the chunker are embedded in one batched pass, like chunk_and_embed_pages
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    for i, vector in zip(missing, embeddings.embed_documents([chunks[i] for i in missing])):
+        vectors[i] = vector
+    return chunks, np.asarray(vectors, dtype=np.float32)
+
+
+def make_queries(pages: list[str], queries: int, rng: random.Random) -> list[tuple[str, str]]:
+    """(query, source sentence) pairs: a shuffled copy of a sentence with about a quarter of its words dropped"""
+    sentences = [s for page in pages for s in split_sentences(page) if len(s.split()) >= 6]
+    pairs = []
+    for sentence in rng.sample(sentences, min(queries, len(sentences))):
+        words = sentence.split()
+        rng.shuffle(words)
+        pairs.append((" ".join(words[: max(4, len(words) * 3 // 4)]), sentence))
+    return pairs
+
+
+def hit_rate(chunks: list[str], vectors: np.ndarray, pairs: list[tuple[str, str]], provider: EmbeddingProvider, k: int) -> float:
+    index = create_index(vectors, "flat")
+    page_offsets = np.array([0, len(chunks)], dtype=np.int64)  # whole document as a single window
+    query_vectors = provider.embed([query for query, _ in pairs])
+    hits = 0
+    for query_vector, (_, sentence) in zip(query_vectors, pairs):
+        _, ids = search_page_window(index, page_offsets, query_vector, 0, 0, k)
+        hits += any(sentence in chunks[i] for i in ids)
+    return hits / max(1, len(pairs))
+
+
+def run(pages: list[str], embedding_latency: float, queries: int, k: int, chunk_tokens: int, seed: int) -> dict:
+    pairs = make_queries(pages, queries, random.Random(seed))
+    local_provider = HashingEmbeddingProvider()
+
+    results = []
+    with StubOpenAIServer(embedding_latency=embedding_latency) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "stub")
+        counters_url = stub.base_url.removesuffix("/v1") + "/stub/counters"
+        remote_provider = OpenAIEmbeddingProvider()
+
+        for strategy in CHUNKING_STRATEGIES:
+            before = httpx.get(counters_url).json()["embedding_requests"]
+            start = time.perf_counter()
+            chunks, _ = chunk_and_embed(pages, strategy, remote_provider, chunk_tokens)
+            seconds = time.perf_counter() - start
+            requests = httpx.get(counters_url).json()["embedding_requests"] - before
+
+            local_chunks, local_vectors = chunk_and_embed(pages, strategy, local_provider, chunk_tokens)
+            results.append({
+                "strategy": strategy,
+                "chunks": len(chunks),
+                "mean_chunk_words": round(float(np.mean([len(c.split()) for c in chunks])), 1) if chunks else 0.0,
+                "pages_per_sec": round(len(pages) / seconds, 1),
+                "embedding_requests": requests,
+                f"hit_at_{k}": round(hit_rate(local_chunks, local_vectors, pairs, local_provider, k), 4),
+            })
+
+    return {
+        "config": {"pages": len(pages), "embedding_latency_ms": embedding_latency * 1000, "queries": len(pairs), "k": k, "chunk_tokens": chunk_tokens},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="benchmark on this PDF instead of a synthetic one")
+    parser.add_argument("--pages", type=int, default=50, help="pages of the synthetic PDF")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, help="window size of the token strategy")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            pdf_bytes = f.read()
+    else:
+        pdf_bytes = make_synthetic_pdf(args.pages, seed=args.seed)
+
+    report = run(extract_pages(pdf_bytes), args.embedding_latency_ms / 1000, args.queries, args.k, args.chunk_tokens, args.seed)
+    for row in report["results"]:
+        print("  ".join(f"{key}={value}" for key, value in row.items()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Offline end-to-end benchmark: ingestion throughput per stage, query latency under load and peak memory.
+
+Everything runs against the local OpenAI stub (benchmarks.stub_openai) with injected latency, on
+synthetic PDFs (benchmarks.synthetic_pdf), so results only depend on this code and the machine.
+
+Ingestion runs in this process, once per page count, timing each stage of the pipeline:
+    extract - PDF text extraction (agents.extraction) and boilerplate removal (agents.boilerplate)
+    chunk   - chunking, excluding the time spent waiting for embeddings
+    embed   - time spent in embedding provider calls (the chunker's and the batched pass)
+    index   - FAISS index, page offsets and BM25 index
+Queries run against the backend in a uvicorn subprocess (see benchmarks.load_test_query), reporting
+throughput and p50/p95/p99 latency per concurrency level, and the backend's peak RSS.
+
+The JSON report carries the git commit and environment so runs can be compared release over release:
+    python -m benchmarks.end_to_end --pages 10,100 --users 1,8,32 --output bench.json
+With --boilerplate the synthetic pages carry running headers, footers and a repeated notice, and the
+report shows how many blocks and duplicate chunks were removed before embedding.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.load_test_query import REPO_ROOT, ingest, run_level, start_backend
+from benchmarks.stub_openai import StubOpenAIServer
+from benchmarks.synthetic_pdf import make_synthetic_pdf
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def self_peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def process_peak_rss_mb(pid: int) -> float | None:
+    """Peak resident set size of another process (Linux only, None elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def measure_ingestion(pdf_bytes: bytes, chunking_strategy: str) -> dict:
+    """Run the ingestion pipeline in-process and time each stage."""
+    # Imported here so the environment prepared by main() (stub URL, cache directories) is in effect
+    from agents.boilerplate import NearDuplicateFilter, strip_boilerplate
+    from agents.extraction import extract_page_blocks
+    from agents.ingest import chunk_and_embed_pages
+    from agents.lexical_index import BM25Index
+    from agents.metrics import collect_timings
+    from agents.vector_index import build_page_offsets, create_index
+
+    start = time.perf_counter()
+    pages, blocks_removed = strip_boilerplate(extract_page_blocks(pdf_bytes))
+    extract_seconds = time.perf_counter() - start
+
+    # Pages are chunked concurrently, so their embedding calls overlap: "embed" is the wall-clock time during
+    # which at least one call was in flight (see agents.metrics), and chunking is the rest of the stage
+    start = time.perf_counter()
+    duplicates = NearDuplicateFilter()
+    with collect_timings({}) as timings:
+        page_chunks, page_embeddings = chunk_and_embed_pages(pages, strategy=chunking_strategy, duplicates=duplicates)
+    chunk_and_embed_seconds = time.perf_counter() - start
+    embed_seconds = timings.get("embed", 0.0)
+
+    start = time.perf_counter()
+    vectors = [vector for vectors in page_embeddings for vector in vectors]
+    if vectors:
+        create_index(vectors)
+    build_page_offsets(page_chunks)
+    BM25Index(page_chunks)
+    index_seconds = time.perf_counter() - start
+
+    num_pages, num_chunks = len(pages), sum(len(chunks) for chunks in page_chunks)
+    stages = {
+        "extract": (extract_seconds, num_pages, "pages"),
+        "chunk": (chunk_and_embed_seconds - embed_seconds, num_pages, "pages"),
+        "embed": (embed_seconds, num_chunks, "chunks"),
+        "index": (index_seconds, num_chunks, "chunks"),
+    }
+    return {
+        "pages": num_pages,
+        "chunks": num_chunks,
+        "boilerplate_blocks_removed": blocks_removed,
+        "duplicate_chunks_removed": duplicates.duplicates,
+        "total_seconds": round(extract_seconds + chunk_and_embed_seconds + index_seconds, 3),
+        "stages": {
+            name: {"seconds": round(seconds, 3), f"{unit}_per_sec": round(count / seconds, 1) if seconds > 0 else None}
+            for name, (seconds, count, unit) in stages.items()
+        },
+        "peak_rss_mb": self_peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="10,100", help="comma separated page counts of the synthetic PDFs")
+    parser.add_argument("--users", default="1,8,32", help="comma separated concurrency levels of the query load")
+    parser.add_argument("--requests-per-user", type=int, default=5)
+    parser.add_argument("--query-pages", type=int, default=20, help="pages of the document queried under load")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--chat-latency-ms", type=float, default=500)
+    parser.add_argument("--chunking-strategy", default="semantic", choices=("semantic", "token"))
+    parser.add_argument("--boilerplate", action="store_true", help="add running headers, footers and a repeated notice to every page")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": vars(args),
+        "ingestion": [],
+        "query": {"levels": []},
+    }
+
+    with tempfile.TemporaryDirectory() as workdir, \
+            StubOpenAIServer(args.embedding_latency_ms / 1000, args.chat_latency_ms / 1000) as stub:
+        os.environ.update({
+            "OPENAI_API_KEY": "stub",
+            "OPENAI_BASE_URL": stub.base_url,
+            "EMBEDDING_CACHE_DIR": os.path.join(workdir, "ingestion-embeddings"),
+        })
+
+        # A different seed per size, so no run is served by the embedding cache of a previous one
+        for seed, pages in enumerate(int(p) for p in args.pages.split(",")):
+            result = measure_ingestion(make_synthetic_pdf(pages, seed=seed, boilerplate=args.boilerplate), args.chunking_strategy)
+            report["ingestion"].append(result)
+            stages = "  ".join(f"{name}={stage['seconds']}s" for name, stage in result["stages"].items())
+            print(
+                f"ingest pages={result['pages']:>5}  chunks={result['chunks']:>6}  {stages}  peak_rss={result['peak_rss_mb']}MB  "
+                f"removed: blocks={result['boilerplate_blocks_removed']} chunks={result['duplicate_chunks_removed']}"
+            )
+
+        backend, backend_url = start_backend(stub.base_url, workdir, {"CHUNKING_STRATEGY": args.chunking_strategy})
+        try:
+            doc_id = ingest(backend_url, make_synthetic_pdf(args.query_pages, seed=len(report["ingestion"]), boilerplate=args.boilerplate))
+            for users in [int(u) for u in args.users.split(",")]:
+                level = asyncio.run(run_level(backend_url, doc_id, args.query_pages, users, args.requests_per_user))
+                report["query"]["levels"].append(level)
+                print(
+                    f"query users={level['users']:>3}  rps={level['throughput_rps']:>7}  "
+                    f"p50={level['p50_ms']:>8}ms  p95={level['p95_ms']:>8}ms  p99={level['p99_ms']:>8}ms  errors={level['errors']}"
+                )
+            report["query"]["backend_peak_rss_mb"] = process_peak_rss_mb(backend.pid)
+        finally:
+            backend.terminate()
+            backend.wait()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
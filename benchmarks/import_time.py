@@ -0,0 +1,144 @@
+"""
+Import time and cold start of the backend.
+
+Runs `python -X importtime -c "import backend.main_backend"` in fresh interpreters and reports the
+import time of the backend module (best of --runs), the slowest modules it pulls in, and whether any
+of the heavy modules that are meant to load lazily (agents.lazy.HEAVY_MODULES) was imported anyway.
+Then starts the backend with uvicorn and measures the time until /health answers and until the
+background warm-up has loaded everything (/health reports ready).
+
+    python -m benchmarks.import_time --runs 5 --top 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from agents.lazy import HEAVY_MODULES
+from benchmarks.stub_openai import free_port
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULE = "backend.main_backend"
+
+
+def parse_importtime(stderr: str, module: str = MODULE) -> tuple[float, list[tuple[str, float, float]]]:
+    """
+    (cumulative seconds of `module`, [(name, self seconds, cumulative seconds)] of every module imported under it).
+    -X importtime prints a module after everything it imported, indented by nesting depth.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), len(name) - len(name.lstrip()), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+
+    for position, (name, depth, _, cumulative) in enumerate(entries):
+        if name == module:
+            subtree = []
+            for child in reversed(entries[:position]):
+                if child[1] <= depth:
+                    break
+                subtree.append((child[0], child[2], child[3]))
+            return cumulative, subtree
+    raise RuntimeError(f"{module} not found in -X importtime output")
+
+
+def measure_import(env: dict) -> tuple[float, list[tuple[str, float, float]]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {MODULE}"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {MODULE} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def measure_cold_start(env: dict, timeout: float = 120) -> dict:
+    """Seconds from launching uvicorn until /health answers, and until it reports ready (unless warm-up is disabled)"""
+    wait_for_ready = env.get("WARM_UP_ON_STARTUP", "1") == "1"
+    port = free_port()
+    backend_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{MODULE}:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    first_response = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError("Backend exited during startup")
+            try:
+                health = httpx.get(f"{backend_url}/health", timeout=1).json()
+            except httpx.HTTPError:
+                time.sleep(0.01)
+                continue
+            if first_response is None:
+                first_response = time.perf_counter() - start
+            if health["ready"] or not wait_for_ready:
+                return {
+                    "first_health_response_s": round(first_response, 3),
+                    "ready_s": round(time.perf_counter() - start, 3) if wait_for_ready else None,
+                    "warm_up_s": health["warm_up_seconds"],
+                }
+            time.sleep(0.01)
+        raise RuntimeError("Backend did not become ready in time")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run(runs: int, top: int) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "stub"),
+            "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embeddings"),
+            "DOCUMENT_STORE_DIR": os.path.join(workdir, "documents"),
+        }
+        measure_import(env)  # first run writes the bytecode caches
+        measurements = [measure_import(env) for _ in range(runs)]
+        import_seconds, modules = min(measurements, key=lambda measurement: measurement[0])
+        cold_start = measure_cold_start(env)
+
+    imported = {name for name, _, _ in modules}
+    return {
+        "config": {"runs": runs, "python": sys.version.split()[0]},
+        "import_s": round(import_seconds, 3),
+        "import_runs_s": [round(seconds, 3) for seconds, _ in measurements],
+        "heavy_modules_imported": [module for module in HEAVY_MODULES if module in imported],
+        "slowest_modules": [
+            {"module": name, "self_ms": round(self_seconds * 1000, 1), "cumulative_ms": round(cumulative * 1000, 1)}
+            for name, self_seconds, cumulative in sorted(modules, key=lambda module: -module[2])[:top]
+        ],
+        "cold_start": cold_start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to import the backend in (best one is reported)")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest modules to list")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    report = run(args.runs, args.top)
+    print(f"import {MODULE}: {report['import_s'] * 1000:.0f} ms (best of {args.runs})")
+    print(f"heavy modules imported: {', '.join(report['heavy_modules_imported']) or 'none'}")
+    for row in report["slowest_modules"]:
+        print(f"  {row['cumulative_ms']:8.1f} ms  {row['module']}")
+    print("  ".join(f"{key}={value}" for key, value in report["cold_start"].items()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
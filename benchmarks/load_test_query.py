@@ -0,0 +1,152 @@
+"""
+Load test of /query_response against a local stub OpenAI server.
+
+Starts the stub (benchmarks.stub_openai) and the backend (uvicorn subprocess pointed at the stub),
+ingests a synthetic PDF, then runs increasing numbers of concurrent users, each sending queries
+back to back. Reports throughput and latency percentiles per concurrency level. With a non-blocking
+query path, throughput should grow with the number of users (up to OPENAI_MAX_CONCURRENCY) while
+latency stays close to the stub's injected latency.
+
+    python -m benchmarks.load_test_query --users 1,2,4,8,16,32 --chat-latency-ms 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.stub_openai import StubOpenAIServer, free_port
+from benchmarks.synthetic_pdf import make_synthetic_pdf
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_backend(stub_base_url: str, workdir: str, extra_env: dict | None = None) -> tuple[subprocess.Popen, str]:
+    """Backend in a subprocess with every cache/store directory inside workdir."""
+    port = free_port()
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": stub_base_url,
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embeddings"),
+        "DOCUMENT_STORE_DIR": os.path.join(workdir, "documents"),
+        **(extra_env or {}),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main_backend:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL,
+    )
+    backend_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{backend_url}/documents/stats", timeout=1).status_code == 200:
+                return process, backend_url
+        except httpx.HTTPError:
+            pass
+        if process.poll() is not None:
+            raise RuntimeError("Backend exited during startup")
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Backend did not start in time")
+
+
+def ingest(backend_url: str, pdf_bytes: bytes) -> str:
+    """Upload a PDF and wait for its ingestion job, returns the doc_id."""
+    response = httpx.post(f"{backend_url}/parse_pdf", files={"file": ("bench.pdf", pdf_bytes, "application/pdf")}, timeout=60)
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    while True:
+        job = httpx.get(f"{backend_url}/jobs/{job_id}", timeout=10).json()
+        if job["status"] == "done":
+            return job["doc_id"]
+        if job["status"] == "failed":
+            raise RuntimeError(f"Ingestion failed: {job['error']}")
+        time.sleep(0.2)
+
+
+def percentiles(latencies: list[float]) -> dict:
+    values = np.asarray(latencies) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(values, p)), 1) for p in (50, 95, 99)}
+
+
+async def run_level(backend_url: str, doc_id: str, num_pages: int, users: int, requests_per_user: int) -> dict:
+    """`users` concurrent users, each sending requests_per_user queries back to back."""
+    latencies, errors = [], 0
+
+    async def user(client: httpx.AsyncClient, user_id: int):
+        nonlocal errors
+        for i in range(requests_per_user):
+            payload = {
+                "doc_id": doc_id,
+                # Unique queries so the embedding cache never short-circuits the API call
+                "query": f"What does section {i % num_pages + 1} say about topic {users}-{user_id}-{i}?",
+                "page_num": i % num_pages + 1,
+                "chat_history": [],
+            }
+            start = time.perf_counter()
+            response = await client.post(f"{backend_url}/query_response", json=payload, timeout=120)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(user(client, u) for u in range(users)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "users": users,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        **percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1,2,4,8,16,32", help="comma separated concurrency levels")
+    parser.add_argument("--requests-per-user", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--chat-latency-ms", type=float, default=500)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = {
+        "config": vars(args),
+        "levels": [],
+    }
+    with tempfile.TemporaryDirectory() as workdir, \
+            StubOpenAIServer(args.embedding_latency_ms / 1000, args.chat_latency_ms / 1000) as stub:
+        backend, backend_url = start_backend(stub.base_url, workdir)
+        try:
+            doc_id = ingest(backend_url, make_synthetic_pdf(args.pages))
+            for users in [int(u) for u in args.users.split(",")]:
+                level = asyncio.run(run_level(backend_url, doc_id, args.pages, users, args.requests_per_user))
+                results["levels"].append(level)
+                print(
+                    f"users={level['users']:>3}  rps={level['throughput_rps']:>7}  "
+                    f"p50={level['p50_ms']:>8}ms  p95={level['p95_ms']:>8}ms  p99={level['p99_ms']:>8}ms  errors={level['errors']}"
+                )
+        finally:
+            backend.terminate()
+            backend.wait()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Local stand-in for the OpenAI embeddings and chat completions endpoints, with injectable latency.
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1. Embeddings are deterministic
+pseudo-random unit vectors derived from a hash of the input, so identical texts get identical vectors.
+A fraction of embedding requests can be rejected with 429 (Retry-After: 0) to exercise client retries.
+
+Run standalone:
+    python -m benchmarks.stub_openai --port 8100 --embedding-latency-ms 50 --chat-latency-ms 800
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import socket
+import threading
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBEDDING_DIMENSION = 1536
+
+
+def stub_vector(item, dimension: int = EMBEDDING_DIMENSION) -> np.ndarray:
+    """Deterministic unit vector for a string or a list of token ids."""
+    seed = int(hashlib.sha256(json.dumps(item).encode("utf-8")).hexdigest()[:16], 16)
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def create_stub_app(
+    embedding_latency: float = 0.0,
+    chat_latency: float = 0.0,
+    dimension: int = EMBEDDING_DIMENSION,
+    token_latency: float = 0.0,
+    embedding_error_rate: float = 0.0,
+) -> FastAPI:
+    """
+    Stub app; latencies are in seconds. embedding_latency and chat_latency are added to every request
+    of that kind (for streamed chat, before the first token), token_latency between streamed tokens.
+    embedding_error_rate is the fraction of embedding requests answered with 429 (every n-th request).
+    """
+    app = FastAPI()
+    app.state.counters = {"embedding_requests": 0, "embedded_inputs": 0, "chat_requests": 0, "rate_limited": 0}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"]
+        # A single string or a single list of token ids is one input
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        app.state.counters["embedding_requests"] += 1
+        await asyncio.sleep(embedding_latency)
+        if embedding_error_rate > 0 and app.state.counters["embedding_requests"] % round(1 / embedding_error_rate) == 0:
+            app.state.counters["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429, headers={"retry-after": "0"},
+            )
+        app.state.counters["embedded_inputs"] += len(inputs)
+
+        data = []
+        for i, item in enumerate(inputs):
+            vector = stub_vector(item, dimension)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+        tokens = sum(len(item) if isinstance(item, list) else len(item.split()) for item in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "stub"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.counters["chat_requests"] += 1
+        await asyncio.sleep(chat_latency)
+
+        prompt_chars = sum(len(message["content"]) for message in body["messages"])
+        answer = f"Stub answer based on a {prompt_chars}-character prompt."
+        completion_id = f"chatcmpl-stub-{app.state.counters['chat_requests']}"
+
+        if body.get("stream"):
+            async def chunks():
+                for i, word in enumerate(answer.split(" ")):
+                    if i:
+                        await asyncio.sleep(token_latency)
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": 8, "total_tokens": prompt_chars // 4 + 8},
+        }
+
+    @app.get("/stub/counters")
+    async def counters():
+        return app.state.counters
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StubOpenAIServer:
+    """Runs the stub in a background thread: `with StubOpenAIServer(chat_latency=0.5) as stub: stub.base_url`"""
+
+    def __init__(
+        self, embedding_latency: float = 0.0, chat_latency: float = 0.0, port: int | None = None,
+        token_latency: float = 0.0, embedding_error_rate: float = 0.0,
+    ):
+        self.app = create_stub_app(embedding_latency, chat_latency, token_latency=token_latency, embedding_error_rate=embedding_error_rate)
+        self.port = port or free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=0.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embedding-error-rate", type=float, default=0.0, help="fraction of embedding requests answered with 429")
+    args = parser.parse_args()
+
+    app = create_stub_app(
+        args.embedding_latency_ms / 1000, args.chat_latency_ms / 1000,
+        token_latency=args.token_latency_ms / 1000, embedding_error_rate=args.embedding_error_rate,
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Synthetic PDFs of configurable page counts for offline benchmarks, built with PyMuPDF."""
+import random
+
+import fitz  # PyMuPdf
+
+WORDS = (
+    "model training data layer attention gradient loss network feature sample batch "
+    "query vector index search page document result method table figure section value "
+    "system memory latency throughput embedding token context answer retrieval chunk"
+).split()
+
+
+def synthetic_paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 18))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+NOTICE = (
+    "Confidential and proprietary. This document is provided for internal evaluation only and may not be "
+    "reproduced or distributed, in whole or in part, without the prior written consent of the publisher."
+)
+
+
+def make_synthetic_pdf(pages: int, paragraphs_per_page: int = 4, seed: int = 0, boilerplate: bool = False) -> bytes:
+    """
+    PDF bytes with `pages` pages of random prose, each page headed by its own section title.
+    With boilerplate, every page also gets a running header, a "Page n of N" footer and a legal notice.
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        if boilerplate:
+            page.insert_text((72, 30), "Synthetic Systems Inc. - Technical Reference Manual", fontsize=8)
+            page.insert_text((280, 820), f"Page {page_num + 1} of {pages}", fontsize=8)
+        page.insert_text((72, 60), f"Section {page_num + 1}: {rng.choice(WORDS).title()} {rng.choice(WORDS).title()}", fontsize=13)
+        body = "\n\n".join(synthetic_paragraph(rng, rng.randint(3, 6)) for _ in range(paragraphs_per_page))
+        if boilerplate:
+            body += "\n\n" + NOTICE
+        page.insert_textbox(fitz.Rect(72, 80, 540, 790), body, fontsize=9)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
@@ -0,0 +1,99 @@
+"""
+Compares the vector storage modes of agents.vector_index (flat, fp16, sq8, pq) on synthetic data.
+
+Chunk vectors are drawn around random topic centers (like chunks of a document sharing themes) and
+normalized, queries are perturbed copies of stored vectors. Every index holds one document, so the
+script runs once per document size in --chunks: for every mode it reports the index actually built
+(pq falls back to sq8 on documents too small for its codebook), memory per chunk (serialized index
+size / chunks), build time, mean page-window search latency, and recall@k against the exact flat index.
+
+    python -m benchmarks.vector_storage --chunks 120,300,1000,3000,10000 --chunks-per-page 2 --k 9
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from agents.vector_index import VECTOR_STORAGE_MODES, create_index, search_page_window
+
+
+def synthetic_vectors(n: int, dimension: int, topics: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((topics, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, topics, n)] + 0.6 * rng.standard_normal((n, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def run_size(chunks: int, pages: int, dimension: int, queries: int, k: int, window: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    vectors = synthetic_vectors(chunks, dimension, topics=max(8, chunks // 50), rng=rng)
+    page_offsets = np.linspace(0, chunks, pages + 1).astype(np.int64)
+
+    # Each query is a noisy copy of a stored chunk, searched within a window centered on that chunk's page
+    targets = rng.integers(0, chunks, queries)
+    query_vectors = vectors[targets] + 0.3 * rng.standard_normal((queries, dimension)).astype(np.float32) / np.sqrt(dimension)
+    query_pages = np.searchsorted(page_offsets, targets, side="right") - 1
+    windows = [(int(p) - window // 2, int(p) + window // 2) for p in query_pages]
+
+    exact = create_index(vectors, "flat")
+    truth = [set(search_page_window(exact, page_offsets, q, a, b, k)[1].tolist()) for q, (a, b) in zip(query_vectors, windows)]
+
+    results = []
+    for mode in VECTOR_STORAGE_MODES:
+        start = time.perf_counter()
+        index = create_index(vectors, mode)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = [search_page_window(index, page_offsets, q, a, b, k)[1] for q, (a, b) in zip(query_vectors, windows)]
+        search_seconds = time.perf_counter() - start
+
+        recall = np.mean([len(set(ids.tolist()) & t) / max(1, len(t)) for ids, t in zip(found, truth)])
+        results.append({
+            "mode": mode,
+            "index_type": type(index).__name__,
+            "bytes_per_chunk": round(len(faiss.serialize_index(index)) / chunks, 1),
+            "build_ms": round(build_seconds * 1000, 1),
+            "search_us_per_query": round(search_seconds / queries * 1e6, 1),
+            f"recall_at_{k}": round(float(recall), 4),
+        })
+    return {"chunks": chunks, "pages": pages, "results": results}
+
+
+def run(sizes: list[int], chunks_per_page: float, dimension: int, queries: int, k: int, window: int, seed: int) -> dict:
+    return {
+        "config": {"chunks_per_page": chunks_per_page, "dimension": dimension, "queries": queries, "k": k, "window_pages": window},
+        "sizes": [
+            run_size(chunks, max(1, round(chunks / chunks_per_page)), dimension, queries, k, window, seed)
+            for chunks in sizes
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", default="120,300,1000,3000,10000", help="comma-separated chunk counts of the documents to index")
+    parser.add_argument("--chunks-per-page", type=float, default=2)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=9)
+    parser.add_argument("--window", type=int, default=3, help="pages per search window")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.chunks.split(",")]
+    report = run(sizes, args.chunks_per_page, args.dimension, args.queries, args.k, args.window, args.seed)
+    for size in report["sizes"]:
+        print(f"{size['chunks']} chunks, {size['pages']} pages")
+        for row in size["results"]:
+            print("  " + "  ".join(f"{key}={value}" for key, value in row.items()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
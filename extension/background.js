@@ -3,6 +3,7 @@ chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
   console.log('Background script received message:', message);
   
   if (message.type === 'PROCESS_QUERY') {
+    // message.data is an /api/query body: {query, pdfContext: {doc_id, page_num, selection}} (see content.js getCurrentPDFState)
     console.log('Processing query:', message.data.query);
     
     // Call the FastAPI backend
@@ -1,3 +1,5 @@
+const BACKEND_URL = 'http://localhost:8000';
+
 // PDF Detection & Injection
 function isPDF(url) {
 	return url.includes('.pdf') ||
@@ -8,11 +10,11 @@ function isPDF(url) {
 function injectPDFViewer(pdfUrl) {
   const viewerUrl = chrome.runtime.getURL('pdf_viewer.html') + `?file=${encodeURIComponent(pdfUrl)}`;
   const chatAppUrl = 'http://localhost:8501'; // Your running Streamlit app
-  
+
   document.documentElement.innerHTML = `
-    <iframe 
-      id="pdf-viewer" 
-      src="${viewerUrl}" 
+    <iframe
+      id="pdf-viewer"
+      src="${viewerUrl}"
       style="width: 70%; height: 100vh; border: none;"
     ></iframe>
     <iframe
@@ -22,32 +24,94 @@ function injectPDFViewer(pdfUrl) {
     ></iframe>
   `;
 
-  setupBridgeApi();
+  setupBridgeApi(pdfUrl);
+}
+
+// The backend answers about a doc_id, returned by /parse_pdf. The PDF is uploaded once per URL,
+// its doc_id is kept in chrome.storage and sent with every query.
+async function uploadPDF(pdfUrl, focusPage) {
+  const pdf = await fetch(pdfUrl).then(response => response.blob());
+  const form = new FormData();
+  form.append('file', pdf, pdfUrl.split('/').pop().split('?')[0] || 'document.pdf');
+  form.append('focus_page', String(focusPage || 1));
+  const response = await fetch(`${BACKEND_URL}/parse_pdf`, {method: 'POST', body: form});
+  if (!response.ok) {
+    throw new Error(`Upload failed: ${response.status}`);
+  }
+  const {doc_id} = await response.json();
+  await chrome.storage.local.set({[`doc:${pdfUrl}`]: doc_id});
+  return doc_id;
+}
+
+async function getDocId(pdfUrl, focusPage) {
+  const key = `doc:${pdfUrl}`;
+  const stored = await chrome.storage.local.get(key);
+  return stored[key] || uploadPDF(pdfUrl, focusPage);
 }
 
-function setupBridgeApi() {
-  // Create a global function the Streamlit iframe can call
-  window.askWithPdfContext = async function(query) {
-    // Get current PDF state
-    const pdfState = await getCurrentPDFState();
-    
-    // Call backend directly (no background.js needed)
-    const response = await fetch('http://localhost:8000/api/query', {
+// Page and highlighted text, asked from the viewer page (pdf_viewer_init.js), which can read the pdf.js frame
+function getViewerState(timeoutMs = 1000) {
+  return new Promise(resolve => {
+    const requestId = Math.random().toString(36).slice(2);
+    const timer = setTimeout(() => {
+      window.removeEventListener('message', onMessage);
+      resolve({page_num: null, selection: ''});
+    }, timeoutMs);
+    function onMessage(event) {
+      if (event.data && event.data.type === 'ASKMYDOC_VIEWER_STATE' && event.data.requestId === requestId) {
+        clearTimeout(timer);
+        window.removeEventListener('message', onMessage);
+        resolve(event.data.state);
+      }
+    }
+    window.addEventListener('message', onMessage);
+    document.getElementById('pdf-viewer').contentWindow.postMessage({type: 'ASKMYDOC_GET_VIEWER_STATE', requestId}, '*');
+  });
+}
+
+async function getCurrentPDFState(pdfUrl) {
+  const state = await getViewerState();
+  return {...state, doc_id: await getDocId(pdfUrl, state.page_num)};
+}
+
+function setupBridgeApi(pdfUrl) {
+  async function askWithPdfContext(query) {
+    const send = async () => fetch(`${BACKEND_URL}/api/query`, {
       method: 'POST',
       headers: {'Content-Type': 'application/json'},
       body: JSON.stringify({
         query: query,
-        pdfContext: pdfState
+        pdfContext: await getCurrentPDFState(pdfUrl)
       })
     });
-    
+
+    let response = await send();
+    if (response.status === 404) {
+      // The stored document was pruned on the server, upload the PDF again
+      await chrome.storage.local.remove(`doc:${pdfUrl}`);
+      response = await send();
+    }
+    if (!response.ok) {
+      throw new Error(`HTTP error: ${response.status}`);
+    }
     return await response.json();
-  };
-  
-  // Make it available to the Streamlit iframe
-  document.getElementById('chat-interface').onload = function() {
-    this.contentWindow.askWithPdfContext = window.askWithPdfContext;
-  };
+  }
+  window.askWithPdfContext = askWithPdfContext;
+
+  // The chat iframe is on another origin: it asks with {type: 'ASKMYDOC_QUERY', requestId, query} and
+  // gets back {type: 'ASKMYDOC_ANSWER', requestId, response} (or error)
+  window.addEventListener('message', async event => {
+    if (!event.data || event.data.type !== 'ASKMYDOC_QUERY') {
+      return;
+    }
+    const chatWindow = document.getElementById('chat-interface').contentWindow;
+    try {
+      const response = await askWithPdfContext(event.data.query);
+      chatWindow.postMessage({type: 'ASKMYDOC_ANSWER', requestId: event.data.requestId, response}, '*');
+    } catch (error) {
+      chatWindow.postMessage({type: 'ASKMYDOC_ANSWER', requestId: event.data.requestId, error: error.message}, '*');
+    }
+  });
 }
 
 
@@ -58,4 +122,4 @@ if (isPDF(window.location.href)) {
   injectPDFViewer(window.location.href);
 } else {
   console.log('Not a PDF page');
-}
\ No newline at end of file
+}
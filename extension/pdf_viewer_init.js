@@ -5,6 +5,21 @@ const pdfUrl = urlParams.get('file');
 if (pdfUrl){
     document.getElementById('pdf-container').src = `pdfjs/web/viewer.html?file=${encodeURIComponent(pdfUrl)}`;
 }
+
+// The page embedding this viewer (content.js) asks for the current page and highlighted text,
+// which only this extension page can read from the pdf.js frame
+window.addEventListener('message', event => {
+    if (!event.data || event.data.type !== 'ASKMYDOC_GET_VIEWER_STATE') {
+        return;
+    }
+    const viewerWindow = document.getElementById('pdf-container').contentWindow;
+    const app = viewerWindow.PDFViewerApplication;
+    const state = {
+        page_num: app ? app.page : null, // 1-based
+        selection: String(viewerWindow.getSelection() || '').trim(),
+    };
+    event.source.postMessage({type: 'ASKMYDOC_VIEWER_STATE', requestId: event.data.requestId, state}, '*');
+});
 // // Wait for the iframe to load
 // document.getElementById('pdf-container').onload = function() {
 // 	const viewerWindow = document.getElementById('pdf-container').contentWindow;
@@ -12,4 +27,4 @@ if (pdfUrl){
 // 	// Send the PDF URL to the viewer
 // 	viewerWindow.postMessage({ type: 'OPEN_PDF_URL', url: pdfUrl }, '*');
 
-// };
\ No newline at end of file
+// };
@@ -1,7 +1,8 @@
 import streamlit as st
 import requests
-import base64
-import fitz  # PyMuPDF for PDF processing
+import json
+import os
+import time
 
 # Configure Streamlit page settings
 
@@ -12,6 +13,11 @@ st.set_page_config(
 )
 # BACKEND_URL = "http://localhost:8000"
 BACKEND_URL = "https://askmydoc-backend.onrender.com"
+# A query about a document still being ingested waits up to INCREMENTAL_WAIT_SECONDS on the backend (same setting)
+# before anything is streamed, then the model needs time for its first token: the read timeout covers both
+INCREMENTAL_WAIT_SECONDS = float(os.getenv("INCREMENTAL_WAIT_SECONDS", "30"))
+LLM_FIRST_TOKEN_SECONDS = 60
+STREAM_TIMEOUT = (10, INCREMENTAL_WAIT_SECONDS + LLM_FIRST_TOKEN_SECONDS)  # (connect, read) seconds
 st.title("AskMyDoc 📃")
 
 # Custom CSS for full-screen PDF viewer
@@ -56,28 +62,88 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Utility Functions
-def get_pdf_page_count(pdf_bytes):
-    try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page_count = len(doc)
-        doc.close()
-        return page_count
-    except Exception:
-        return 0
+INGESTION_STAGE_LABELS = {
+    None: "Waiting for a worker...",
+    "extract": "Extracting text",
+    "chunk_and_embed": "Chunking and embedding",
+    "index": "Building the index",
+    "persist": "Saving",
+}
 
-def send_chat_message(message, page_number, frontend_chat_history):
-    try:
-        payload = {
-            "query": message,
-            "page_num": page_number,
-            "chat_history": frontend_chat_history
-        }
-        response = requests.post(f"{BACKEND_URL}/query_response", json=payload, timeout=30)
-        print("response:", response.text)  # Debugging output
+def wait_for_ingestion(job_id, progress_bar, poll_interval=1.0):
+    """
+    Poll the backend ingestion job, updating a progress bar, until the document can be queried.
+    The pages around the focus page are ingested first and answer queries while the rest is still
+    being processed, so this returns as soon as they are done. Returns the latest job status.
+    """
+    while True:
+        response = requests.get(f"{BACKEND_URL}/jobs/{job_id}", timeout=10)
         response.raise_for_status()
-        return response.json()
+        job = response.json()
+        if job["status"] in ("done", "failed"):
+            return job
+        if job["stage"] == "chunk_and_embed" and job["progress"].get("pages_chunked"):
+            return job
+
+        progress = job["progress"]
+        total_pages = progress.get("total_pages") or 0
+        if job["stage"] == "extract" and total_pages:
+            fraction = 0.1 * progress.get("pages_extracted", 0) / total_pages
+        elif job["stage"] == "chunk_and_embed" and total_pages:
+            fraction = 0.1 + 0.8 * progress.get("pages_chunked", 0) / total_pages
+        elif job["stage"] in ("index", "persist"):
+            fraction = 0.95
+        else:
+            fraction = 0.0
+        label = INGESTION_STAGE_LABELS.get(job["stage"], job["stage"])
+        if progress.get("chunks_embedded"):
+            label += f" ({progress['chunks_embedded']} chunks embedded)"
+        progress_bar.progress(min(fraction, 1.0), text=label)
+        time.sleep(poll_interval)
+
+def create_chat_session(doc_id):
+    """Starts a server-side conversation about the document, the backend keeps its history."""
+    response = requests.post(f"{BACKEND_URL}/sessions", json={"doc_id": doc_id}, timeout=10)
+    response.raise_for_status()
+    return response.json()["session_id"]
+
+def stream_chat_message(doc_id, message, page_number, session_id):
+    """Yields the assistant's answer piece by piece from the backend's Server-Sent Events stream."""
+    # Only the new message is sent, the conversation so far is kept in the backend session
+    payload = {
+        "doc_id": doc_id,
+        "session_id": session_id,
+        "query": message,
+        "page_num": page_number
+    }
+    try:
+        with requests.post(f"{BACKEND_URL}/query_response/stream", json=payload, stream=True, timeout=STREAM_TIMEOUT) as response:
+            if response.status_code == 404 and response.json()["detail"].startswith("Session"):
+                # The session expired on the server, continue in a fresh one
+                st.session_state.session_id = create_chat_session(doc_id)
+                yield from stream_chat_message(doc_id, message, page_number, st.session_state.session_id)
+                return
+            if response.status_code == 404:
+                yield "This document is no longer loaded on the server. Please upload it again using 📤 New PDF."
+                return
+            if response.status_code == 409:
+                yield "This document is still being processed, please try again in a moment."
+                return
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                if event.get("done"):
+                    return
+                yield event.get("delta", "")
     except Exception as e:
-        return f"Connection error: {str(e)}"
+        yield f"Connection error: {str(e)}"
+
+def render_chat_history():
+    for msg in st.session_state.chat_history:
+        with st.chat_message(msg["role"]):
+            st.write(msg["content"])
 
 # Session State Initialization
 def initialize_session_state():
@@ -90,6 +156,10 @@ def initialize_session_state():
 
 def clear_chat_history():
     st.session_state.chat_history = []
+    try:
+        st.session_state.session_id = create_chat_session(st.session_state.doc_id)
+    except Exception as e:
+        st.error(f"❌ Failed to start a new chat: {e}")
 
 def reset_all_session_state():
     st.session_state.clear()
@@ -105,12 +175,20 @@ if not st.session_state.pdf_uploaded:
         pdf_bytes = uploaded_file.read()
         try:
             files = {"file": (uploaded_file.name, pdf_bytes, "application/pdf")}
-            with st.spinner("Parsing PDF..."):
-                response = requests.post(f"{BACKEND_URL}/parse_pdf", files=files, timeout=120)
+            data = {"focus_page": st.session_state.current_page}
+            response = requests.post(f"{BACKEND_URL}/parse_pdf", files=files, data=data, timeout=60)
             print(response)
-            st.session_state.pdf_bytes = pdf_bytes
+            response.raise_for_status()
+            
+            # The backend ingests in the background, follow the job until the first pages can be queried
+            job = wait_for_ingestion(response.json()["job_id"], st.progress(0.0, text="Uploading..."))
+            if job["status"] == "failed":
+                raise RuntimeError(job["error"])
+            st.session_state.doc_id = job["doc_id"]
+            st.session_state.session_id = create_chat_session(job["doc_id"])
+            # The PDF is not kept here, the viewer loads it from the backend
             st.session_state.pdf_name = uploaded_file.name
-            st.session_state.total_pages = get_pdf_page_count(pdf_bytes)
+            st.session_state.total_pages = job["progress"].get("total_pages") or 1
             st.session_state.pdf_uploaded = True
             st.success("✅ PDF parsed successfully!")
             st.rerun()
@@ -121,11 +199,12 @@ else:
     col1, col2 = st.columns([7, 3])  # 70% for PDF, 30% for chat
     
     with col1:
-        pdf_base64 = base64.b64encode(st.session_state.pdf_bytes).decode()
+        # Served by the backend with Range support, the browser fetches (and caches) only what it displays
+        pdf_url = f"{BACKEND_URL}/documents/{st.session_state.doc_id}/file"
         pdf_display = f"""
         <div class="pdf-viewer">
             <iframe
-                src="data:application/pdf;base64,{pdf_base64}#page={st.session_state.current_page}"
+                src="{pdf_url}#page={st.session_state.current_page}"
                 width="100%"
                 height="100%"
                 type="application/pdf">
@@ -161,13 +240,16 @@ else:
                 "content": user_query
             })
             
-            # Get assistant response
-            with st.spinner("Processing your question..."):
-                response = send_chat_message(
-                    message=user_query,
-                    page_number=chat_page,
-                    frontend_chat_history=st.session_state.chat_history
-                )
+            # Stream the assistant response into the chat as it is generated
+            with st.container(height=600):
+                render_chat_history()
+                with st.chat_message("assistant"):
+                    response = st.write_stream(stream_chat_message(
+                        doc_id=st.session_state.doc_id,
+                        message=user_query,
+                        page_number=chat_page,
+                        session_id=st.session_state.session_id
+                    ))
             
             # Add assistant response to chat history
             st.session_state.chat_history.append({
@@ -181,9 +263,7 @@ else:
         # Display all chat messages within the scrollable container
         chat_history_container = st.container(height=600)  # Fixed height with scrolling
         with chat_history_container:
-            for msg in st.session_state.chat_history:
-                with st.chat_message(msg["role"]):
-                    st.write(msg["content"])
+            render_chat_history()
         
         st.markdown("---")
         col_clear, col_upload = st.columns(2)
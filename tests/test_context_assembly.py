@@ -0,0 +1,43 @@
+import pytest
+
+from agents import tokens
+from agents.context_assembly import trim_history
+from agents.sessions import ConversationSession
+from agents.tokens import count_tokens
+
+
+class WordEncoding:
+    """One token per word, stands in for tiktoken's cl100k_base, which is downloaded on first use"""
+
+    def encode_ordinary(self, text: str) -> list[str]:
+        return text.split()
+
+    def decode(self, tokens: list[str]) -> str:
+        return " ".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(tokens, "get_encoding", WordEncoding)
+
+
+def test_trim_history_keeps_summary_over_budget():
+    session = ConversationSession("doc")
+    session.summary = "The user asked about the warranty terms of chapter 3. " * 10
+    for i in range(20):
+        session.add_turn(f"Question {i} about page {i}?", f"Answer {i}: " + "details " * 30)
+
+    history, tokens = trim_history(session.prompt_history(), max_tokens=300)
+
+    assert history[0] == {"role": "summary", "content": session.summary}
+    assert history[-1] == session.turns[-1]
+    assert 1 < len(history) < len(session.turns) + 1
+    assert tokens <= 300
+
+
+def test_trim_history_cuts_summary_larger_than_budget():
+    history, tokens = trim_history([{"role": "summary", "content": "word " * 500}, {"role": "user", "content": "Hi"}], max_tokens=50)
+
+    assert [message["role"] for message in history] == ["summary"]
+    assert count_tokens(history[0]["content"]) < 50
+    assert tokens <= 50